@@ -1,9 +1,8 @@
+import math
 import streamlit as st
 from datetime import datetime
 import app_utils as utils
-
-# --- Run the cleanup function at the start of every session ---
-utils.cleanup_json_files()
+from categories import CS_CATEGORIES
 
 # --- Initialize session state keys ---
 # This ensures that the keys exist on the first run
@@ -13,26 +12,21 @@ if 'results_links' not in st.session_state:
     st.session_state['results_links'] = []
 if 'results_cluster_sizes' not in st.session_state:
     st.session_state['results_cluster_sizes'] = {}
+if 'results_dir' not in st.session_state:
+    st.session_state['results_dir'] = None
+if 'results_timings' not in st.session_state:
+    st.session_state['results_timings'] = []
+if 'results_analysis_dir' not in st.session_state:
+    st.session_state['results_analysis_dir'] = None
+if 'results_keywords' not in st.session_state:
+    st.session_state['results_keywords'] = None
+if 'results_id' not in st.session_state:
+    st.session_state['results_id'] = None
+# (analysis dir, eps, min_pts) the displayed results were clustered with
+if 'results_clustered_with' not in st.session_state:
+    st.session_state['results_clustered_with'] = None
 
 
-# --- Mapping of user-friendly names to ArXiv category codes ---
-CS_CATEGORIES = {
-    "Artificial Intelligence": "cs.AI",
-    "Machine Learning": "cs.LG",
-    "Computer Vision and Pattern Recognition": "cs.CV",
-    "Computation and Language": "cs.CL",
-    "Robotics": "cs.RO",
-    "Human-Computer Interaction": "cs.HC",
-    "Networking and Internet Architecture": "cs.NI",
-    "Cryptography and Security": "cs.CR",
-    "Databases": "cs.DB",
-    "Software Engineering": "cs.SE",
-    "Data Structures and Algorithms": "cs.DS",
-    "Graphics": "cs.GR",
-    "Operating Systems": "cs.OS",
-    "Distributed, Parallel, and Cluster Computing": "cs.DC"
-}
-
 # --- Streamlit UI ---
 
 st.set_page_config(layout="wide")
@@ -59,19 +53,56 @@ with st.sidebar:
 if submitted:
     category_code = CS_CATEGORIES[selected_field]
     start_year, end_year = year_range
+    # Prebuilt views come straight from their snapshot, without running the pipeline
+    snapshot = utils.load_snapshot(category_code, start_year, end_year) if start_year < end_year else None
     
     if start_year >= end_year:
         st.error("Error: Start year must be before end year.")
+    elif snapshot is not None:
+        st.info(f"Loaded the precomputed analysis for '{selected_field}' ({category_code}) from {start_year} to {end_year}.")
+        st.session_state['results_links'] = snapshot['links']
+        st.session_state['results_cluster_sizes'] = snapshot['cluster_sizes']
+        st.session_state['results_keywords'] = snapshot['keywords']
+        st.session_state['results_id'] = snapshot['id']
+        st.session_state['results_dir'] = None
+        st.session_state['results_analysis_dir'] = None
+        st.session_state['results_timings'] = []
+        st.session_state['results_clustered_with'] = None
+        st.session_state['analysis_complete'] = True
     else:
         st.info(f"Running analysis for category '{selected_field}' ({category_code}) from {start_year} to {end_year}...")
         status_placeholder = st.empty()
+        live_placeholder = st.empty()
         
         with st.spinner("Analysis in progress... This may take several minutes."):
             try:
-                # Run the pipeline and save results to session state
-                links, cluster_sizes = utils.run_analysis_pipeline(category_code, start_year, end_year, status_placeholder)
+                # Run the pipeline, rendering each year and pair of years as soon as it is ready
+                with live_placeholder.container():
+                    st.header("Results so far")
+                    sankey_slot = st.empty()
+                    partial_links, partial_keywords = [], {}
+                    for event in utils.iter_analysis_pipeline(category_code, start_year, end_year, status_placeholder):
+                        if event["event"] == "year":
+                            partial_keywords[event["year"]] = event["keywords"]
+                            if event["cluster_sizes"]:
+                                pie_fig = utils.generate_pie_chart(event["cluster_sizes"], event["year"], keywords=event["keywords"])
+                                st.plotly_chart(pie_fig, use_container_width=True, key=f"live_pie_{event['year']}")
+                        elif event["event"] == "links" and event["links"]:
+                            partial_links.extend(event["links"])
+                            sankey_fig = utils.generate_sankey_diagram(partial_links, keywords_by_year=partial_keywords)
+                            sankey_slot.plotly_chart(sankey_fig, use_container_width=True, key=f"live_sankey_{len(partial_links)}")
+                        elif event["event"] == "done":
+                            links, cluster_sizes, results_dir, profiler = event["result"]
+                # The complete results are rendered below
+                live_placeholder.empty()
                 st.session_state['results_links'] = links
                 st.session_state['results_cluster_sizes'] = cluster_sizes
+                st.session_state['results_dir'] = results_dir
+                st.session_state['results_analysis_dir'] = results_dir
+                st.session_state['results_keywords'] = None
+                st.session_state['results_id'] = results_dir
+                st.session_state['results_timings'] = profiler.rows()
+                st.session_state['results_clustered_with'] = (results_dir, utils.EPS, utils.MIN_PTS)
                 st.session_state['analysis_complete'] = True
 
             except Exception as e:
@@ -79,12 +110,39 @@ if submitted:
                 st.exception(e) # This will print the full traceback for debugging
                 st.session_state['analysis_complete'] = False
 
+# --- Live re-clustering from the stored neighbor graphs ---
+if st.session_state['analysis_complete']:
+    analysis_dir = st.session_state['results_analysis_dir']
+    max_eps = utils.recluster_max_eps(analysis_dir) if analysis_dir else None
+    if max_eps is not None:
+        with st.sidebar:
+            st.header("Re-cluster")
+            eps = st.slider("DBSCAN eps:", min_value=0.05, max_value=float(max_eps),
+                            value=min(utils.EPS, float(max_eps)), step=0.05)
+            min_pts = st.slider("DBSCAN min points:", min_value=1, max_value=30, value=utils.MIN_PTS)
+        # Other widgets rerun the script too; only a changed slider re-clusters
+        if st.session_state['results_clustered_with'] != (analysis_dir, eps, min_pts):
+            try:
+                links, cluster_sizes, results_dir = utils.recluster_analysis(analysis_dir, eps, min_pts)
+                st.session_state['results_links'] = links
+                st.session_state['results_cluster_sizes'] = cluster_sizes
+                st.session_state['results_dir'] = results_dir
+                st.session_state['results_id'] = results_dir
+                st.session_state['results_clustered_with'] = (analysis_dir, eps, min_pts)
+            except (OSError, ValueError) as e:
+                st.sidebar.error(f"Could not re-cluster: {e}")
+
 # --- Logic for Displaying Results (runs if analysis is complete) ---
 if st.session_state['analysis_complete']:
     
     # Retrieve results from session state
     links = st.session_state['results_links']
     cluster_sizes = st.session_state['results_cluster_sizes']
+    results_dir = st.session_state['results_dir']
+    analysis_id = st.session_state['results_id']
+    # Keywords and titles of every year, built once per analysis
+    index = utils.keyword_index(analysis_id, results_dir, st.session_state['results_keywords'])
+    keywords_by_year = index['keywords']
     
     if not any(cluster_sizes.values()):
         st.warning("No topics were found in the selected date range.")
@@ -97,7 +155,8 @@ if st.session_state['analysis_complete']:
         if valid_years:
             # The selectbox can now be interacted with without losing state
             selected_year = st.selectbox("Choose a year to inspect:", options=valid_years)
-            pie_fig = utils.generate_pie_chart(cluster_sizes[selected_year], selected_year)
+            pie_fig = utils.pie_chart_figure(analysis_id, selected_year, cluster_sizes[selected_year],
+                                             keywords_by_year.get(selected_year, {}))
             st.plotly_chart(pie_fig, use_container_width=True)
         else:
             st.info("No topics available to display in a pie chart.")
@@ -107,26 +166,63 @@ if st.session_state['analysis_complete']:
         if not links:
             st.warning("No semantic links were found between the discovered topics.")
         else:
-            sankey_fig = utils.generate_sankey_diagram(links)
+            sankey_fig = utils.sankey_figure(analysis_id, utils.SANKEY_MAX_LINKS, links, keywords_by_year)
             st.plotly_chart(sankey_fig, use_container_width=True)
+            if len(links) > utils.SANKEY_MAX_LINKS:
+                st.caption(f"Showing the {utils.SANKEY_MAX_LINKS} strongest of {len(links)} links.")
+
+        # --- Lineage of one topic over the whole range ---
+        st.header("Trace a Topic")
+        evolution = utils.evolution_index(analysis_id, links, keywords_by_year)
+        query = st.text_input("Find topics by keywords:", placeholder="e.g. neural network")
+        topics = evolution.find(query) if query.strip() else evolution.topics()
+        if not topics:
+            st.info("No topic has all of these keywords.")
+        else:
+            topic = st.selectbox("Topic to trace:", options=topics,
+                                 format_func=lambda t: utils.topic_label(t, index['titles']))
+            direction = st.radio("Direction:", options=["forward", "backward"], horizontal=True,
+                                 format_func=lambda d: "Where it went" if d == "forward" else "Where it came from")
+            path = evolution.lineage(*topic, direction=direction)
+            if len(path) == 1:
+                st.info("This topic has no links in that direction.")
+            else:
+                st.dataframe(utils.lineage_rows(path, keywords_by_year, index['titles']), use_container_width=True)
+                reached = evolution.reachable(*topic, direction=direction)
+                st.caption(f"Strongest path shown; linked to {len(reached)} topics over "
+                           f"{len({year for year, _, _ in reached})} years in all.")
+            for line in utils.lineage_events(evolution, path, index['titles']):
+                st.markdown(f"- {line}")
 
         # --- Expander for detailed text results ---
         with st.expander("Show Detailed Links List"):
             if not links:
                 st.write("No links to display.")
             else:
-                sorted_links = sorted(links, key=lambda k: (k['source_year'], k['similarity']), reverse=True)
-                for link in sorted_links:
+                sorted_links = utils.sorted_links(analysis_id, links)
+                # One page at a time: the expander's content is rebuilt on every rerun
+                n_pages = math.ceil(len(sorted_links) / utils.LINKS_PER_PAGE)
+                page = st.number_input("Page:", min_value=1, max_value=n_pages, value=1) if n_pages > 1 else 1
+                first = (page - 1) * utils.LINKS_PER_PAGE
+                page_links = sorted_links[first:first + utils.LINKS_PER_PAGE]
+                st.caption(f"Links {first + 1}–{first + len(page_links)} of {len(sorted_links)}")
+                for link in page_links:
                     source_year, target_year = link['source_year'], link['target_year']
                     source_cluster_id, target_cluster_id = str(link['source_cluster']), str(link['target_cluster'])
-                    source_keywords_data, target_keywords_data = utils.load_keywords(source_year), utils.load_keywords(target_year)
-                    source_keywords_list = source_keywords_data.get(source_cluster_id, [])
-                    target_keywords_list = target_keywords_data.get(target_cluster_id, [])
-                    source_title = utils.generate_cluster_title(source_keywords_list)
-                    target_title = utils.generate_cluster_title(target_keywords_list)
+                    source_keywords_list = keywords_by_year.get(source_year, {}).get(source_cluster_id, [])
+                    target_keywords_list = keywords_by_year.get(target_year, {}).get(target_cluster_id, [])
+                    source_title = index['titles'].get(source_year, {}).get(source_cluster_id, utils.generate_cluster_title([]))
+                    target_title = index['titles'].get(target_year, {}).get(target_cluster_id, utils.generate_cluster_title([]))
                     source_keywords_str = ", ".join(f"`{k}`" for k in source_keywords_list)
                     target_keywords_str = ", ".join(f"`{k}`" for k in target_keywords_list)
                     st.markdown(f"#### {source_year} ➔ {target_year} (Similarity: {link['similarity']:.3f})")
                     st.markdown(f"- **From Topic in {source_year}:** *{source_title}*\n  - **Keywords:** {source_keywords_str}")
                     st.markdown(f"- **To Topic in {target_year}:** *{target_title}*\n  - **Keywords:** {target_keywords_str}")
-                    st.divider()
\ No newline at end of file
+                    st.divider()
+
+        # --- Expander with per-stage timings of the last run ---
+        with st.expander("⏱️ Stage Timings"):
+            if st.session_state['results_timings']:
+                st.dataframe(st.session_state['results_timings'], use_container_width=True)
+            else:
+                st.write("No timings recorded.")
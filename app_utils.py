@@ -1,42 +1,62 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import json
+import heapq
 import os
-import glob
-import plotly.graph_objects as go
-import plotly.express as px
-from collections import Counter
+import streamlit as st
 
 # --- Import your existing pipeline functions ---
-from data_fetch import fetch_arxiv_year
-from preprocess import preprocess_text
-from tfidf_manual import build_vocabulary, compute_tf, compute_idf
-from clustering import dbscan_cosine
-from cluster_semantics import extract_cluster_semantics, extract_cluster_keywords
-from save_results import save_cluster_semantics, save_cluster_keywords
-from semantic_linking import link_clusters_semantic
+# The pipeline, re-clustering and plotting modules are imported on first use:
+# the sidebar form draws without them, and views served from a snapshot
+# never load the pipeline at all
+from centroid_store import open_year, load_vocabulary, stored_years
+from profiling import StageProfiler
+from snapshots import find_snapshot, read_snapshot
+from evolution_index import EvolutionIndex
 
-# --- Utility and Helper Functions ---
+# DBSCAN parameters of a fresh analysis; the sidebar sliders re-cluster from here
+EPS = 0.8
+MIN_PTS = 3
+# A fresh analysis stores neighbor graphs up to this eps, the sidebar's re-clustering limit
+GRAPH_MAX_EPS = 0.85
+# Worker processes of one analysis at most: every session shares the server's CPUs
+MAX_WORKERS = 2
 
-def cleanup_json_files():
-    results_dir = "results"
-    if not os.path.exists(results_dir):
-        return
-    json_files = glob.glob(os.path.join(results_dir, "*.json"))
-    for file_path in json_files:
-        try:
-            os.remove(file_path)
-        except OSError as e:
-            print(f"Error deleting file {file_path}: {e}")
+# Rows of the detailed links list per page, and links drawn in the Sankey diagram (strongest first)
+LINKS_PER_PAGE = 25
+SANKEY_MAX_LINKS = 300
+
+# --- Utility and Helper Functions ---
 
 @st.cache_data
-def load_keywords(year):
-    path = os.path.join("results", f"clusters_keywords_{year}.json")
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return None
+def load_keywords(year, results_dir):
+    """{str(cluster_id): [keywords]} for one year, read from the columnar centroid store."""
+    stored = open_year(results_dir, year)
+    vocab = load_vocabulary(results_dir)
+    if stored is None or vocab is None:
+        return None
+    return stored.keywords(vocab)
+
+def year_keywords(year, results_dir=None, keywords_by_year=None):
+    """Keywords of one year from `keywords_by_year` (e.g. a snapshot's) when given, else from `results_dir`."""
+    if keywords_by_year is not None:
+        return keywords_by_year.get(year, {})
+    return load_keywords(year, results_dir)
+
+@st.cache_resource(max_entries=8)
+def _read_snapshot(path, mtime):
+    # Shared across reruns and sessions without a copy per access; callers must not modify it.
+    # The modification time is part of the cache key, so a re-exported snapshot is read again
+    return read_snapshot(path)
+
+def load_snapshot(category, start_year, end_year):
+    """
+    The precomputed snapshot of this view (see snapshots.py) as a dict with
+    links, cluster_sizes and keywords, or None if the view has to be computed.
+    """
+    path = find_snapshot(category, start_year, end_year)
+    if path is None:
+        return None
+    mtime = os.path.getmtime(path)
+    # The id names the snapshot in the per-analysis caches below
+    return dict(_read_snapshot(path, mtime), id=f"{path}@{mtime}")
 
 def generate_cluster_title(keywords):
     if not keywords:
@@ -46,9 +66,14 @@ def generate_cluster_title(keywords):
 
 # --- Visualization Functions ---
 
-def generate_pie_chart(cluster_sizes_for_year, year):
-    """Creates a pie chart for a single year's topic distribution."""
-    keywords_data = load_keywords(year)
+def generate_pie_chart(cluster_sizes_for_year, year, results_dir=None, keywords=None):
+    """
+    Creates a pie chart for a single year's topic distribution.
+    Keywords come from `keywords` ({str(cluster_id): [words]}) when given,
+    e.g. for a year that is still streaming in, else from `results_dir`.
+    """
+    import plotly.graph_objects as go
+    keywords_data = keywords if keywords is not None else load_keywords(year, results_dir)
     if not keywords_data or not cluster_sizes_for_year:
         return go.Figure().update_layout(title_text=f"No topic data for {year}")
 
@@ -63,7 +88,9 @@ def generate_pie_chart(cluster_sizes_for_year, year):
     fig.update_layout(title_text=f"Topic Distribution for {year}")
     return fig
 
-def generate_sankey_diagram(links):
+def generate_sankey_diagram(links, results_dir=None, keywords_by_year=None):
+    """Sankey of the links; node keywords come from `keywords_by_year` when given, else from `results_dir`."""
+    import plotly.graph_objects as go
     if not links: return go.Figure()
     all_nodes, node_map = set(), {}
     for link in links:
@@ -73,7 +100,7 @@ def generate_sankey_diagram(links):
     node_map = {node: i for i, node in enumerate(sorted_nodes)}
     node_labels, node_hover_text = [], []
     for year, cluster_id in sorted_nodes:
-        keywords = load_keywords(year).get(cluster_id, [])
+        keywords = year_keywords(year, results_dir, keywords_by_year).get(cluster_id, [])
         cluster_title = generate_cluster_title(keywords)
         label = f"<b>{year}</b><br>{cluster_title}"
         node_labels.append(label)
@@ -94,48 +121,133 @@ def generate_sankey_diagram(links):
     fig.update_layout(title_text="Topic Flow Between Years", font_size=12, height=800)
     return fig
 
+# --- Per-analysis caches ---
+# Keyed by an analysis id (its results directory, or its snapshot file and
+# modification time), so the reruns Streamlit does on every widget change
+# reuse the keyword index and figures of the analysis on screen.
+# Underscore arguments are not hashed: the id already determines them.
+
+@st.cache_resource(max_entries=16)
+def keyword_index(analysis_id, results_dir=None, _keywords_by_year=None):
+    """
+    {"keywords": {year: {str(cluster_id): [words]}}, "titles": {year: {str(cluster_id): title}}}
+    for every year of an analysis, read once from `results_dir` unless the
+    keywords are given (e.g. by a snapshot).
+    """
+    keywords = _keywords_by_year
+    if keywords is None:
+        keywords = {}
+        vocab = load_vocabulary(results_dir)
+        for year in stored_years(results_dir):
+            stored = open_year(results_dir, year)
+            keywords[year] = stored.keywords(vocab) if vocab is not None else {}
+    titles = {year: {cid: generate_cluster_title(words) for cid, words in year_keywords.items()}
+              for year, year_keywords in keywords.items()}
+    return {"keywords": keywords, "titles": titles}
+
+@st.cache_resource(max_entries=256)
+def pie_chart_figure(analysis_id, year, _cluster_sizes, _keywords):
+    return generate_pie_chart(_cluster_sizes, year, keywords=_keywords)
+
+def strongest_links(links, max_links):
+    """The `max_links` most similar links, in their original order."""
+    if len(links) <= max_links:
+        return links
+    keep = set(heapq.nlargest(max_links, range(len(links)), key=lambda i: links[i]['similarity']))
+    return [link for i, link in enumerate(links) if i in keep]
+
+@st.cache_resource(max_entries=16)
+def sankey_figure(analysis_id, max_links, _links, _keywords_by_year):
+    return generate_sankey_diagram(strongest_links(_links, max_links), keywords_by_year=_keywords_by_year)
+
+@st.cache_resource(max_entries=16)
+def sorted_links(analysis_id, _links):
+    """Links for the detailed list: latest source year first, then by similarity."""
+    return sorted(_links, key=lambda k: (k['source_year'], k['similarity']), reverse=True)
+
+@st.cache_resource(max_entries=16)
+def evolution_index(analysis_id, _links, _keywords_by_year):
+    """The analysis' EvolutionIndex (lineages, splits/merges, keyword lookup), built once."""
+    return EvolutionIndex(_links, _keywords_by_year)
+
+def topic_label(topic, titles):
+    """ "2019 | Neural / Network / Training" for a (year, cluster_id) topic."""
+    year, cluster_id = topic
+    return f"{year} | {titles.get(year, {}).get(str(cluster_id), generate_cluster_title([]))}"
+
+def lineage_rows(path, keywords_by_year, titles):
+    """Table rows of an `EvolutionIndex.lineage` path."""
+    return [
+        {"year": step["year"], "topic": topic_label((step["year"], step["cluster"]), titles).split(" | ", 1)[1],
+         "keywords": ", ".join(keywords_by_year.get(step["year"], {}).get(str(step["cluster"]), [])),
+         "link similarity": None if step["similarity"] is None else round(step["similarity"], 3),
+         "cumulative similarity": round(step["cumulative"], 3)}
+        for step in path
+    ]
+
+def lineage_events(evolution, path, titles):
+    """One line per split or merge of a topic on the path."""
+    on_path = {(step["year"], step["cluster"]) for step in path}
+    lines = []
+    for kind, events in (("splits into", evolution.splits), ("merges", evolution.merges)):
+        for event in events:
+            if (event["year"], event["cluster"]) in on_path:
+                branches = ", ".join(f"*{topic_label((event['other_year'], cid), titles)}* ({sim:.2f})"
+                                     for cid, sim in event["branches"])
+                lines.append(f"{topic_label((event['year'], event['cluster']), titles)} {kind} "
+                             f"{len(event['branches'])} topics of {event['other_year']}: {branches}")
+    return lines
+
 # --- Main analysis pipeline ---
-def run_analysis_pipeline(category, start_year, end_year, status_placeholder):
+def iter_analysis_pipeline(category, start_year, end_year, status_placeholder, workers=None, profiler=None):
+    """
+    Runs (or reuses from the results store) one analysis, yielding the
+    pipeline's events as they happen: "year" (clusters and keywords of one
+    year) and "links" (one pair of years) for progressive rendering, then
+    "done" whose "result" is (links, cluster_sizes_by_year, results_dir, profiler).
+    Stage timings are collected in `profiler` (a new StageProfiler if None),
+    and `workers` defaults to one per CPU up to MAX_WORKERS.
+    """
     MAX_RESULTS = 500
-    EPS = 0.8
-    MIN_PTS = 3
     TOP_N = 10
     MAX_FEATURES = 3000
-    year_docs, cluster_sizes_by_year = {}, {}
-    all_docs = []
-    for year in range(start_year, end_year + 1):
-        status_placeholder.text(f"📅 Fetching and cleaning year: {year}...")
-        df = fetch_arxiv_year(category, year, max_results=MAX_RESULTS)
-        if df.empty:
-            year_docs[year], cluster_sizes_by_year[year] = [], {}
-            continue
-        df["cleaned"] = df["abstract"].apply(preprocess_text)
-        docs = df["cleaned"].tolist()
-        year_docs[year] = docs
-        all_docs.extend(docs)
-    status_placeholder.text(f"📖 Building global vocabulary with top {MAX_FEATURES} features...")
-    global_vocab = build_vocabulary(all_docs, max_features=MAX_FEATURES)
-    global_idf = compute_idf(all_docs, global_vocab)
-    for year in range(start_year, end_year + 1):
-        status_placeholder.text(f"⚙️ Processing year: {year}...")
-        docs = year_docs[year]
-        if not docs:
-            cluster_sizes_by_year[year] = {}
-            continue
-        tfidf_matrix = np.array([compute_tf(doc, global_vocab) * global_idf for doc in docs])
-        labels = dbscan_cosine(tfidf_matrix, eps=EPS, min_pts=MIN_PTS)
-        label_counts = Counter(labels)
-        if -1 in label_counts: del label_counts[-1]
-        cluster_sizes_by_year[year] = label_counts
-        num_clusters = len(label_counts)
-        status_placeholder.text(f"Found {num_clusters} clusters for {year}...")
-        semantics = extract_cluster_semantics(tfidf_matrix, labels)
-        keywords = extract_cluster_keywords(tfidf_matrix, global_vocab, labels, top_n=TOP_N)
-        save_cluster_semantics(year, semantics)
-        save_cluster_keywords(year, keywords)
-    status_placeholder.text("🔗 Linking clusters across years...")
-    links = link_clusters_semantic(start_year, end_year, threshold=0.1)
-    with open("results/topic_links_semantic.json", "w") as f:
-        json.dump(links, f, indent=4)
-    status_placeholder.text("✅ Analysis complete!")
-    return links, cluster_sizes_by_year
\ No newline at end of file
+    from pipeline import iter_analysis
+    from year_processing import default_workers
+    profiler = profiler or StageProfiler()
+    if workers is None:
+        workers = min(default_workers(), MAX_WORKERS)
+    for event in iter_analysis(category, start_year, end_year, EPS, MIN_PTS, top_n=TOP_N, max_features=MAX_FEATURES,
+                               max_results=MAX_RESULTS, link_threshold=0.1, report=status_placeholder.text,
+                               workers=workers, profiler=profiler, graph_max_eps=GRAPH_MAX_EPS):
+        if event["event"] == "done":
+            status_placeholder.text("✅ Analysis complete!")
+            result = event["result"]
+            event = {"event": "done", "result": (result["links"], result["cluster_sizes"], result["results_dir"], profiler)}
+        yield event
+
+def run_analysis_pipeline(category, start_year, end_year, status_placeholder, workers=None, profiler=None):
+    """
+    Runs (or reuses from the results store) one analysis.
+    Stage timings are collected in `profiler` (a new StageProfiler if None).
+    Returns (links, cluster_sizes_by_year, results_dir, profiler).
+    """
+    for event in iter_analysis_pipeline(category, start_year, end_year, status_placeholder, workers, profiler):
+        if event["event"] == "done":
+            return event["result"]
+
+@st.cache_data
+def recluster_max_eps(results_dir):
+    """Largest eps the analysis' stored neighbor graphs allow, or None if it cannot be re-clustered."""
+    from reclustering import load_graph_meta
+    meta = load_graph_meta(results_dir)
+    return None if meta is None else meta["max_eps"]
+
+def recluster_analysis(results_dir, eps, min_pts):
+    """
+    Re-clusters a stored analysis with new DBSCAN parameters from its
+    neighbor graphs (no fetching or distance computation).
+    Returns (links, cluster_sizes_by_year, results_dir).
+    """
+    from reclustering import recluster
+    result = recluster(results_dir, eps, min_pts)
+    return result["links"], result["cluster_sizes"], result["results_dir"]
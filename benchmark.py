@@ -0,0 +1,323 @@
+"""
+Offline benchmark suite for the analysis pipeline.
+
+Generates synthetic arXiv-like corpora (controllable size, vocabulary and
+topic structure), times every stage and the full in-process pipeline at
+several scales, checks the fast implementations against the reference
+ones on a sample, and writes machine-readable JSON so runs from different
+commits can be compared:
+
+    python benchmark.py --scales 1000,10000,100000
+    python benchmark.py --compare bench_results/old.json bench_results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+from preprocess import STOPWORDS, preprocess_text, preprocess_batch
+from tfidf_manual import build_vocabulary, build_term_counts, idf_from_doc_freq, tfidf_from_counts, compute_tf
+from clustering import dbscan_cosine, dbscan_reference, lsh_dbscan, compare_neighbor_modes, lsh_tables_for_recall, \
+    lsh_bits_for_size, LSH_RECALL
+from cluster_semantics import aggregate_clusters, extract_cluster_semantics, extract_cluster_keyword_ids
+from semantic_linking import link_cluster_edges, cosine_similarity
+from year_processing import iter_process_years, split_counts_by_year
+from profiling import StageProfiler
+from feature_hashing import FeatureHasher, HASH_FEATURES
+from dedup import minhash_signatures
+
+RESULTS_DIR = "bench_results"
+DEFAULT_SCALES = (1000, 10000, 100000)
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "zi", "pe", "sa", "do", "gu", "fy", "ha", "ji", "wu"]
+FILLER = sorted(STOPWORDS)
+
+def make_vocabulary(size, seed=0):
+    """`size` distinct letter-only pseudo-words that survive preprocessing."""
+    rng = np.random.default_rng(seed)
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        if word not in seen and word not in STOPWORDS:
+            seen.add(word)
+            words.append(word)
+    return words
+
+def make_synthetic_corpus(n_docs, vocab_size=5000, n_topics=20, n_years=5, words_per_doc=90,
+                          topic_share=0.6, drift=0.05, seed=0):
+    """
+    Synthetic abstracts with a planted topic structure.
+    Each topic owns a slice of the vocabulary; a document draws `topic_share`
+    of its words from its topic (Zipf-weighted), the rest from the whole
+    vocabulary, plus stopwords, numbers and punctuation for the cleaner.
+    Topics drift by `drift` of their slice per year so cross-year linking has
+    something to follow.
+    Returns {"docs": [...], "topics": array, "years": array}.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array(make_vocabulary(vocab_size, seed))
+    topic_width = max(vocab_size // n_topics, 10)
+    zipf = 1.0 / np.arange(1, topic_width + 1)
+    zipf /= zipf.sum()
+    background = 1.0 / np.arange(1, vocab_size + 1)
+    background /= background.sum()
+
+    topics = rng.integers(0, n_topics, size=n_docs)
+    years = np.sort(rng.integers(0, n_years, size=n_docs))
+    n_topic_words = rng.binomial(words_per_doc, topic_share, size=n_docs)
+    docs = []
+    for i in range(n_docs):
+        offset = topics[i] * topic_width + int(years[i] * drift * topic_width)
+        topic_words = (offset + rng.choice(topic_width, size=n_topic_words[i], p=zipf)) % vocab_size
+        other_words = rng.choice(vocab_size, size=words_per_doc - n_topic_words[i], p=background)
+        tokens = list(vocab[np.concatenate([topic_words, other_words])])
+        tokens += list(rng.choice(FILLER, size=words_per_doc // 3))
+        rng.shuffle(tokens)
+        tokens[0] = tokens[0].capitalize()
+        docs.append(" ".join(tokens) + f" (in {rng.integers(1990, 2030)}), [v{rng.integers(1, 4)}].")
+    return {"docs": docs, "topics": topics, "years": years}
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def check_against_reference(cleaned, vocab, idf, eps, min_pts, top_n, sample_docs, seed=0):
+    """
+    Compares the fast implementations with the reference ones on a random
+    sample of documents. Returns {check_name: bool}.
+    """
+    rng = np.random.default_rng(seed)
+    sample = sorted(rng.choice(len(cleaned), size=min(sample_docs, len(cleaned)), replace=False))
+    docs = [cleaned[i] for i in sample]
+    checks = {}
+
+    counts, lengths, _ = build_term_counts(docs, vocab)
+    sparse = tfidf_from_counts(counts, lengths, idf)
+    dense = np.array([compute_tf(doc, vocab) * idf for doc in docs])
+    checks["tfidf_matches_compute_tf"] = bool(np.allclose(sparse.toarray(), dense, rtol=1e-12, atol=0))
+
+    labels = dbscan_cosine(sparse, eps, min_pts)
+    checks["dbscan_matches_reference"] = labels == dbscan_reference(dense, eps, min_pts)
+
+    semantics = extract_cluster_semantics(sparse, labels)
+    reference_means = {c: dense[[i for i, l in enumerate(labels) if l == c]].mean(axis=0) for c in set(labels) - {-1}}
+    checks["semantics_match_mean"] = all(np.allclose(semantics[c], reference_means[c]) for c in reference_means)
+    keyword_ids = extract_cluster_keyword_ids(sparse, labels, top_n=top_n)
+    # Compare scores rather than ids: tied scores may legitimately come out in another order
+    checks["keywords_match_argsort"] = all(
+        np.allclose(reference_means[c][keyword_ids[c]], np.sort(reference_means[c])[-top_n:][::-1])
+        for c in reference_means
+    )
+
+    # Link the sample's clusters against a shuffled copy of themselves
+    half = {2000: semantics, 2001: {c + 1000: v[::-1] for c, v in semantics.items()}}
+    edges = link_cluster_edges(half, threshold=0.1)
+    reference = [
+        (c1, c2) for c1, v1 in half[2000].items() for c2, v2 in half[2001].items()
+        if cosine_similarity(v1, v2) >= 0.1
+    ]
+    checks["links_match_pairwise"] = [(int(e["source_cluster"]), int(e["target_cluster"])) for e in edges] == reference
+    return checks
+
+def run_scale(n_docs, args):
+    """Times every stage for one corpus size and returns a result dict."""
+    profiler = StageProfiler(trace_memory=args.trace_memory)
+    with profiler.stage("generate", items=n_docs):
+        corpus = make_synthetic_corpus(n_docs, vocab_size=args.vocab_size, n_topics=args.topics,
+                                       n_years=args.years, seed=args.seed)
+    docs = corpus["docs"]
+
+    with profiler.stage("preprocess", items=n_docs):
+        cleaned = [preprocess_text(doc) for doc in docs]
+    with profiler.stage("preprocess_batch", items=n_docs):
+        tokens = preprocess_batch(docs, workers=args.workers)
+    with profiler.stage("minhash", items=n_docs):
+        minhash_signatures(docs)
+    with profiler.stage("vocabulary", items=n_docs):
+        vocab = build_vocabulary(cleaned, max_features=args.max_features)
+    with profiler.stage("term_counts", items=n_docs):
+        counts, lengths, doc_freq = build_term_counts(cleaned, vocab)
+        idf = idf_from_doc_freq(doc_freq, n_docs)
+    with profiler.stage("tfidf", items=n_docs):
+        tfidf = tfidf_from_counts(counts, lengths, idf)
+    if args.hash_features > 0:
+        # Single-pass alternative to the vocabulary + term_counts + tfidf stages
+        with profiler.stage("hashing", items=n_docs):
+            hasher = FeatureHasher(n_features=args.hash_features)
+            hashed, hashed_lengths = hasher.transform(cleaned)
+            tfidf_from_counts(hashed, hashed_lengths, hasher.weights())
+
+    skipped, lsh_report = [], None
+    labels = None
+    if n_docs <= args.max_dbscan_docs:
+        with profiler.stage("dbscan", items=n_docs * n_docs, unit="pairs"):
+            labels = dbscan_cosine(tfidf, args.eps, args.min_pts)
+    else:
+        skipped.append("dbscan")
+    # Bits for this scale and tables for the target recall unless given
+    lsh_bits = args.lsh_bits if args.lsh_bits is not None else lsh_bits_for_size(n_docs)
+    lsh_tables = args.lsh_tables if args.lsh_tables is not None \
+        else lsh_tables_for_recall(args.eps, args.lsh_recall, n_bits=lsh_bits)
+    if lsh_tables > 0:
+        if labels is not None:
+            # Accuracy and speed of the LSH mode against exact DBSCAN on the same matrix
+            lsh_report = compare_neighbor_modes(tfidf, args.eps, args.min_pts, n_tables=lsh_tables,
+                                                n_bits=lsh_bits, seed=args.seed)
+            profiler.add_record("dbscan_lsh", lsh_report["approx_s"], lsh_report["approx_cpu_s"], items=n_docs)
+        else:
+            # Exact clustering was skipped: the downstream stages use the LSH labels
+            with profiler.stage("dbscan_lsh", items=n_docs):
+                labels, _ = lsh_dbscan(tfidf, args.eps, args.min_pts, n_tables=lsh_tables, n_bits=lsh_bits,
+                                       seed=args.seed)
+    if labels is not None:
+        with profiler.stage("semantics", items=n_docs):
+            semantics = extract_cluster_semantics(tfidf, labels)
+        with profiler.stage("keywords", items=n_docs):
+            extract_cluster_keyword_ids(tfidf, labels, top_n=args.top_n)
+        with profiler.stage("aggregate", items=n_docs):
+            aggregate_clusters(tfidf, labels, top_n=args.top_n)
+        n_clusters = len(semantics)
+    else:
+        skipped += ["semantics", "keywords", "aggregate"]
+        n_clusters = None
+
+    # Full in-process pipeline: vocabulary and IDF over all years, then per-year clustering and linking
+    years = sorted(set(corpus["years"].tolist()))
+    year_docs = {year: [cleaned[i] for i in np.flatnonzero(corpus["years"] == year)] for year in years}
+    approximate = max(len(d) for d in year_docs.values()) > args.max_dbscan_docs
+    if not approximate or lsh_tables > 0:
+        # Each year derives its own bits (and tables, unless given) from its size
+        lsh_shape = {"n_tables": args.lsh_tables, "n_bits": args.lsh_bits} if args.lsh_tables is not None \
+            else {"recall": args.lsh_recall, "n_bits": args.lsh_bits}
+        dbscan_options = {"approximate": True, "seed": args.seed, **lsh_shape} if approximate else None
+        with profiler.stage("full_pipeline", items=n_docs, approximate=approximate):
+            ordered = [doc for year in years for doc in year_docs[year]]
+            full_vocab = build_vocabulary(ordered, max_features=args.max_features)
+            full_counts, full_lengths, full_df = build_term_counts(ordered, full_vocab)
+            full_idf = idf_from_doc_freq(full_df, len(ordered))
+            year_counts = split_counts_by_year(full_counts, full_lengths, year_docs, years)
+            results = {r["year"]: r for r in iter_process_years(year_counts, full_idf, args.eps,
+                                                                args.min_pts, args.top_n, workers=args.workers,
+                                                                dbscan_options=dbscan_options)}
+            edges = link_cluster_edges({y: r["semantics"] for y, r in results.items()}, threshold=0.1)
+        n_links = len(edges)
+    else:
+        skipped.append("full_pipeline")
+        n_links = None
+
+    checks = {}
+    if args.reference_docs > 0:
+        with profiler.stage("reference_checks", items=min(args.reference_docs, n_docs)):
+            checks = check_against_reference(cleaned, vocab, idf, args.eps, args.min_pts, args.top_n,
+                                              args.reference_docs, seed=args.seed)
+            checks["batch_preprocess_matches_text"] = [" ".join(words) for words in tokens] == cleaned
+
+    return {
+        "n_docs": n_docs,
+        "n_clusters": n_clusters,
+        "n_links": n_links,
+        "skipped": skipped,
+        "lsh_report": lsh_report,
+        "checks": checks,
+        "stages": {record["stage"]: record for record in profiler.records},
+    }
+
+def compare(old_path, new_path):
+    """Prints per-stage wall-time ratios (new / old) for the scales both files share."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'scale':>8}  {'stage':<18}{'old (s)':>10}{'new (s)':>10}{'ratio':>8}")
+    old_scales = {str(r["n_docs"]): r for r in old["results"]}
+    for result in new["results"]:
+        previous = old_scales.get(str(result["n_docs"]))
+        if previous is None:
+            continue
+        for stage, record in result["stages"].items():
+            if stage not in previous["stages"]:
+                continue
+            before, after = previous["stages"][stage]["wall_s"], record["wall_s"]
+            ratio = after / before if before > 0 else float("inf")
+            flag = "  ⚠" if ratio > 1.2 else ""
+            print(f"{result['n_docs']:>8}  {stage:<18}{before:>10.3f}{after:>10.3f}{ratio:>8.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora.")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated corpus sizes (documents)")
+    parser.add_argument("--vocab-size", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--max-features", type=int, default=3000)
+    parser.add_argument("--eps", type=float, default=0.8)
+    parser.add_argument("--min-pts", type=int, default=3)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-dbscan-docs", type=int, default=20000,
+                        help="skip exact clustering stages above this many documents (quadratic)")
+    parser.add_argument("--lsh-recall", type=float, default=LSH_RECALL,
+                        help="target recall at distance eps; sets the LSH tables unless --lsh-tables is given")
+    parser.add_argument("--lsh-tables", type=int, default=None,
+                        help="hash tables for the approximate (LSH) DBSCAN stage (0 disables it)")
+    parser.add_argument("--lsh-bits", type=int, default=None,
+                        help="hyperplanes per LSH table (default: grows with log2 of the document count)")
+    parser.add_argument("--hash-features", type=int, default=HASH_FEATURES,
+                        help="buckets of the feature hashing stage (0 skips it)")
+    parser.add_argument("--reference-docs", type=int, default=300,
+                        help="documents sampled for the reference-implementation checks (0 disables)")
+    parser.add_argument("--trace-memory", action="store_true", help="per-stage peak memory via tracemalloc")
+    parser.add_argument("--output", help=f"JSON output path (default: {RESULTS_DIR}/<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = _git_commit()
+    results = []
+    for n_docs in (int(s) for s in args.scales.split(",") if s.strip()):
+        print(f"\n📊 Benchmarking {n_docs} documents...")
+        result = run_scale(n_docs, args)
+        results.append(result)
+        for stage, record in result["stages"].items():
+            throughput = "" if record["throughput"] is None else f"{record['throughput']:,.0f} {record['unit']}/s"
+            print(f"  {stage:<18}{record['wall_s']:>10.3f}s  {throughput}")
+        if result["lsh_report"]:
+            report = result["lsh_report"]
+            print(f"  LSH vs exact ({report['n_tables']} tables x {report['n_bits']} bits): "
+                  f"ARI {report['adjusted_rand_index']:.3f}, core recall {report['core_recall']:.3f}, "
+                  f"neighbor recall {report['neighbor_recall']:.3f} (expected at eps {report['boundary_recall']:.3f}), "
+                  f"{report['approx_clusters']} vs {report['exact_clusters']} clusters, "
+                  f"{report['approx_s']:.3f}s vs {report['exact_s']:.3f}s")
+        if result["skipped"]:
+            print(f"  skipped: {', '.join(result['skipped'])}")
+        for check, ok in result["checks"].items():
+            print(f"  {'✅' if ok else '❌'} {check}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'nogit'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "results": results,
+        }, f, indent=4, default=str)
+    print(f"\n📁 Results written to {output}")
+    if not all(ok for result in results for ok in result["checks"].values()):
+        raise SystemExit("Reference checks failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# --- Mapping of user-friendly names to ArXiv category codes ---
+CS_CATEGORIES = {
+    "Artificial Intelligence": "cs.AI",
+    "Machine Learning": "cs.LG",
+    "Computer Vision and Pattern Recognition": "cs.CV",
+    "Computation and Language": "cs.CL",
+    "Robotics": "cs.RO",
+    "Human-Computer Interaction": "cs.HC",
+    "Networking and Internet Architecture": "cs.NI",
+    "Cryptography and Security": "cs.CR",
+    "Databases": "cs.DB",
+    "Software Engineering": "cs.SE",
+    "Data Structures and Algorithms": "cs.DS",
+    "Graphics": "cs.GR",
+    "Operating Systems": "cs.OS",
+    "Distributed, Parallel, and Cluster Computing": "cs.DC"
+}
@@ -0,0 +1,96 @@
+"""
+Columnar, memory-mappable storage of per-year cluster results.
+
+Inside an analysis directory:
+- vocab.npy                        unicode array of vocabulary terms
+- clusters_{year}_ids.npy          int32 cluster ids, one per row
+- clusters_{year}_centroids.npy    float32 centroid matrix (clusters x vocab)
+- clusters_{year}_sizes.npy        int32 documents per cluster
+- clusters_{year}_keyword_ids.npy  int32 vocab indices of each cluster's top keywords, -1 padded
+
+Everything is a plain .npy file, so nothing is pickled and the centroid
+matrix can be memory-mapped and read one cluster at a time.
+"""
+import os
+import numpy as np
+
+VOCAB_FILE = "vocab.npy"
+YEAR_COLUMNS = ("ids", "centroids", "sizes", "keyword_ids")
+
+def year_path(results_dir, year, column):
+    return os.path.join(results_dir, f"clusters_{year}_{column}.npy")
+
+def write_vocabulary(results_dir, vocab):
+    os.makedirs(results_dir, exist_ok=True)
+    np.save(os.path.join(results_dir, VOCAB_FILE), np.array(vocab, dtype=str))
+
+def load_vocabulary(results_dir):
+    path = os.path.join(results_dir, VOCAB_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, allow_pickle=False)
+
+def write_year(results_dir, year, cluster_ids, centroids, sizes, keyword_ids):
+    """Writes one year's columns; rows of every column follow `cluster_ids`."""
+    os.makedirs(results_dir, exist_ok=True)
+    columns = {
+        "ids": np.asarray(cluster_ids, dtype=np.int32),
+        "centroids": np.atleast_2d(np.asarray(centroids, dtype=np.float32)),
+        "sizes": np.asarray(sizes, dtype=np.int32),
+        "keyword_ids": np.atleast_2d(np.asarray(keyword_ids, dtype=np.int32)),
+    }
+    for column in YEAR_COLUMNS:
+        np.save(year_path(results_dir, year, column), columns[column])
+
+class YearClusters:
+    """
+    Read-only view of one year's stored clusters. Ids, sizes and keyword ids
+    are small and loaded eagerly; the centroid matrix is memory-mapped, so
+    `centroid(cluster_id)` only touches that cluster's row.
+    """
+
+    def __init__(self, results_dir, year, mmap_mode="r"):
+        self.year = year
+        self.ids = np.load(year_path(results_dir, year, "ids"), allow_pickle=False)
+        self.sizes = np.load(year_path(results_dir, year, "sizes"), allow_pickle=False)
+        self.keyword_ids = np.load(year_path(results_dir, year, "keyword_ids"), allow_pickle=False)
+        # Zero-length files cannot be mapped
+        self.centroids = np.load(year_path(results_dir, year, "centroids"),
+                                 mmap_mode=mmap_mode if len(self.ids) else None, allow_pickle=False)
+        self._rows = {int(cid): row for row, cid in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def centroid(self, cluster_id):
+        return np.asarray(self.centroids[self._rows[int(cluster_id)]])
+
+    def size(self, cluster_id):
+        return int(self.sizes[self._rows[int(cluster_id)]])
+
+    def keywords(self, vocab):
+        """{str(cluster_id): [keywords]} in the format the UI expects."""
+        return {
+            str(int(cid)): [str(vocab[i]) for i in row if i >= 0]
+            for cid, row in zip(self.ids, self.keyword_ids)
+        }
+
+def has_year(results_dir, year):
+    return os.path.exists(year_path(results_dir, year, "ids"))
+
+def stored_years(results_dir):
+    """Years with stored clusters in a directory, ascending."""
+    try:
+        names = os.listdir(results_dir)
+    except OSError:
+        return []
+    years = (name[len("clusters_"):-len("_ids.npy")] for name in names
+             if name.startswith("clusters_") and name.endswith("_ids.npy"))
+    # clusters_{year}_keyword_ids.npy ends the same way
+    return sorted(int(year) for year in years if year.isdigit())
+
+def open_year(results_dir, year, mmap_mode="r"):
+    """Returns a YearClusters view, or None when the year has no stored clusters."""
+    if not has_year(results_dir, year):
+        return None
+    return YearClusters(results_dir, year, mmap_mode=mmap_mode)
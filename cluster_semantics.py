@@ -1,45 +1,120 @@
 import numpy as np
+import scipy.sparse as sp
 
-def extract_cluster_semantics(tfidf_matrix, labels):
+def _top_ids(scores, top_n):
+    """
+    Indices of the `top_n` highest scores, best first, using a partial
+    selection instead of a full sort. Ties keep the order of
+    np.argsort(scores, kind="stable")[-top_n:][::-1] (higher index first).
+    """
+    if top_n >= len(scores):
+        return np.argsort(scores, kind="stable")[::-1]
+    if top_n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    threshold = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+    # Everything above the threshold, plus every index tied with it
+    candidates = np.flatnonzero(scores >= threshold)
+    order = np.lexsort((-candidates, -scores[candidates]))
+    return candidates[order[:top_n]]
+
+def aggregate_clusters(tfidf_matrix, labels, top_n=5, chunk_rows=None):
+    """
+    Grouped reduction over the labels: a cluster-indicator
+    matrix times the TF-IDF rows gives every cluster's sum at once.
+    Noise (-1) is left out. `tfidf_matrix` may be dense or scipy sparse.
+    With `chunk_rows` the rows are read `chunk_rows` at a time (two passes:
+    sums, then distances to the centroids), e.g. from a memory-mapped matrix.
+    Returns a dict of arrays, one row per cluster in ascending id order:
+    - ids, sizes
+    - centroids: mean TF-IDF vectors (clusters x vocab)
+    - keyword_ids: vocab indices of the top_n centroid weights, best first
+    - mean_distance / max_distance: cosine distance of members to their centroid
+    - variance: mean squared Euclidean distance of members to their centroid
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    n_rows, n_features = tfidf_matrix.shape
+    members = np.flatnonzero(labels != -1) # -1 is for noise points
+    ids, group = np.unique(labels[members], return_inverse=True)
+    k = len(ids)
+    indicator = sp.csr_matrix((np.ones(len(members)), (group, members)), shape=(k, len(labels)))
+    sizes = np.bincount(group, minlength=k)
+    chunks = [(0, n_rows)] if chunk_rows is None else \
+        [(start, min(start + chunk_rows, n_rows)) for start in range(0, n_rows, chunk_rows)]
+
+    sums = np.zeros((k, n_features))
+    # Column slices of the indicator, one per chunk, are cheap in CSC form
+    chunk_indicator = indicator if chunk_rows is None else indicator.tocsc()
+    for start, stop in chunks:
+        if chunk_rows is None:
+            chunk_sums = indicator @ tfidf_matrix
+        else:
+            chunk_sums = chunk_indicator[:, start:stop] @ tfidf_matrix[start:stop]
+        sums += chunk_sums.toarray() if sp.issparse(chunk_sums) else np.asarray(chunk_sums)
+    centroids = sums / np.maximum(sizes, 1)[:, None]
+
+    # Each member's dot product with its own centroid only
+    row_sq_norms, own_dot = np.zeros(len(members)), np.zeros(len(members))
+    for start, stop in chunks:
+        first, last = np.searchsorted(members, [start, stop])
+        rows, chunk_group = tfidf_matrix[members[first:last]], group[first:last]
+        if sp.issparse(rows):
+            rows = sp.csr_matrix(rows)
+            data = rows.data.astype(np.float64, copy=False)
+            row_of = np.repeat(np.arange(last - first), np.diff(rows.indptr))
+            row_sq_norms[first:last] = np.bincount(row_of, weights=data ** 2, minlength=last - first)
+            own_dot[first:last] = np.bincount(row_of, weights=data * centroids[chunk_group[row_of], rows.indices],
+                                              minlength=last - first)
+        else:
+            rows = np.asarray(rows, dtype=np.float64)
+            row_sq_norms[first:last] = np.einsum("ij,ij->i", rows, rows)
+            own_dot[first:last] = np.einsum("ij,ij->i", rows, centroids[chunk_group])
+    centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    # ||x - c||^2 averaged over a cluster is mean(||x||^2) - ||c||^2
+    variance = np.bincount(group, weights=row_sq_norms, minlength=k) / np.maximum(sizes, 1) - centroid_sq_norms
+    norms = np.sqrt(row_sq_norms) * np.sqrt(centroid_sq_norms[group])
+    distance = np.where(norms > 0, 1.0 - own_dot / np.where(norms > 0, norms, 1.0), 1.0)
+    mean_distance = np.bincount(group, weights=distance, minlength=k) / np.maximum(sizes, 1)
+    max_distance = np.zeros(k)
+    np.maximum.at(max_distance, group, distance)
+
+    width = min(top_n, n_features)
+    keyword_ids = np.zeros((k, width), dtype=np.int64)
+    for row in range(k):
+        keyword_ids[row] = _top_ids(centroids[row], width)
+
+    return {
+        "ids": ids,
+        "sizes": sizes,
+        "centroids": centroids,
+        "keyword_ids": keyword_ids,
+        "mean_distance": mean_distance,
+        "max_distance": max_distance,
+        "variance": np.maximum(variance, 0.0),
+    }
+
+def extract_cluster_semantics(tfidf_matrix, labels, aggregates=None):
     """
     Returns dict { cluster_id: semantic_vector }
     where semantic_vector is the mean TF-IDF vector for that cluster.
+    `tfidf_matrix` may be a dense array or a scipy sparse matrix.
+    Pass `aggregates` from `aggregate_clusters` to reuse an earlier pass.
+    """
+    if aggregates is None:
+        aggregates = aggregate_clusters(tfidf_matrix, labels, top_n=0)
+    return {int(cid): centroid for cid, centroid in zip(aggregates["ids"], aggregates["centroids"])}
+
+def extract_cluster_keyword_ids(tfidf_matrix, labels, top_n=5, aggregates=None):
+    """
+    Returns dict { cluster_id: [vocab indices of top keywords] }.
+    `aggregates` (from `aggregate_clusters` with at least `top_n` keywords) skips the recomputation.
     """
-    cluster_semantics = {}
-    unique_labels = set(labels)
-    for cluster_id in unique_labels:
-        if cluster_id == -1: # -1 is for noise points
-            continue
-        # Get indices of documents in the current cluster
-        cluster_indices = [i for i, lbl in enumerate(labels) if lbl == cluster_id]
-        if not cluster_indices:
-            continue
-        
-        cluster_docs_vectors = tfidf_matrix[cluster_indices]
-        avg_vector = np.mean(cluster_docs_vectors, axis=0)
-        cluster_semantics[cluster_id] = avg_vector
-        
-    return cluster_semantics
+    if aggregates is None:
+        aggregates = aggregate_clusters(tfidf_matrix, labels, top_n=top_n)
+    return {int(cid): [int(i) for i in row[:top_n]] for cid, row in zip(aggregates["ids"], aggregates["keyword_ids"])}
 
 def extract_cluster_keywords(tfidf_matrix, vocab, labels, top_n=5):
     """
     Returns dict { cluster_id: [top keywords] } for labeling clusters later.
     """
-    cluster_keywords = {}
-    unique_labels = set(labels)
-    for cluster_id in unique_labels:
-        if cluster_id == -1: # -1 is for noise points
-            continue
-            
-        cluster_indices = [i for i, lbl in enumerate(labels) if lbl == cluster_id]
-        if not cluster_indices:
-            continue
-        
-        cluster_docs_vectors = tfidf_matrix[cluster_indices]
-        avg_tfidf = np.mean(cluster_docs_vectors, axis=0)
-        
-        # Get indices of top N tf-idf scores
-        top_indices = np.argsort(avg_tfidf)[-top_n:][::-1]
-        cluster_keywords[cluster_id] = [vocab[i] for i in top_indices]
-        
-    return cluster_keywords
+    keyword_ids = extract_cluster_keyword_ids(tfidf_matrix, labels, top_n=top_n)
+    return {cluster_id: [vocab[i] for i in ids] for cluster_id, ids in keyword_ids.items()}
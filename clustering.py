@@ -1,4 +1,23 @@
+import time
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+# Default memory budget for one block of the similarity matrix (bytes).
+BLOCK_MEMORY_BYTES = 64 * 1024 * 1024
+# Largest eps a stored neighbor graph supports when re-clustering.
+GRAPH_MAX_EPS = 0.9
+# Default random-hyperplane LSH shape for approximate neighborhoods:
+# more tables raise recall, more bits per table shrink the buckets.
+LSH_TABLES = 8
+# Unless given, the bits per table grow with log2(n) so that an average
+# bucket keeps about this many rows (see `lsh_bits_for_size`)
+LSH_BUCKET_ROWS = 256
+# Default chance that approximate mode finds a pair at exactly distance eps;
+# the number of tables is derived from it (see `lsh_tables_for_recall`)
+LSH_RECALL = 0.9
+# Small LSH buckets are compared together in groups of about this many rows
+LSH_GROUP_ROWS = 64
 
 def cosine_distance(a, b):
     dot = np.dot(a, b)
@@ -12,6 +31,301 @@ def region_query(data, idx, eps):
             neighbors.append(i)
     return neighbors
 
+def normalize_rows(data):
+    """
+    Returns a copy of `data` with every row scaled to unit L2 norm, in
+    float32 for float32 input (e.g. out-of-core TF-IDF) and float64 otherwise.
+    All-zero rows stay zero, so their cosine distance to anything is 1.0,
+    the same convention as `cosine_distance`. Sparse input stays sparse.
+    """
+    dtype = np.float32 if data.dtype == np.float32 else np.float64
+    if sp.issparse(data):
+        data = sp.csr_matrix(data, dtype=dtype)
+        norms = np.sqrt(np.asarray(data.multiply(data).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.diags((1.0 / norms).astype(dtype)) @ data
+    data = np.asarray(data, dtype=dtype)
+    norms = np.linalg.norm(data, axis=1)
+    norms[norms == 0] = 1.0
+    return data / norms[:, None]
+
+def block_rows_for_budget(n_rows, memory_bytes=BLOCK_MEMORY_BYTES):
+    """Number of query rows whose float64 similarity block against `n_rows` fits the budget."""
+    return max(1, int(memory_bytes // (8 * max(n_rows, 1))))
+
+def _blocked_neighbors(data, eps, memory_bytes, keep_similarities, spill_path=None, normalized=False,
+                       transposed=None):
+    unit = data if normalized else normalize_rows(data)
+    n = unit.shape[0]
+    # distance <= eps  <=>  similarity >= 1 - eps
+    min_sim = 1.0 - eps
+    block = block_rows_for_budget(n, memory_bytes)
+    # Sparse products convert a CSC right operand to CSR, so transpose once instead of per block
+    if transposed is None:
+        transposed = unit.T.tocsr() if sp.issparse(unit) else unit.T
+    counts = np.zeros(n, dtype=np.int64)
+    chunks, sim_chunks = [], []
+    spill = open(spill_path, "wb") if spill_path is not None else None
+    try:
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            sims = unit[start:stop] @ transposed
+            if sp.issparse(sims):
+                sims = sims.toarray()
+            rows, cols = np.nonzero(sims >= min_sim)
+            counts[start:stop] = np.bincount(rows, minlength=stop - start)
+            if spill is not None:
+                spill.write(cols.astype(np.int64).tobytes())
+            else:
+                chunks.append(cols.astype(np.int64))
+            if keep_similarities:
+                sim_chunks.append(sims[rows, cols])
+    finally:
+        if spill is not None:
+            spill.close()
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    if spill is not None:
+        # Neighbor lists stay on disk and are paged in as DBSCAN reads them
+        indices = np.memmap(spill_path, dtype=np.int64, mode="r") if indptr[-1] else np.zeros(0, dtype=np.int64)
+    else:
+        indices = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+    if not keep_similarities:
+        return indptr, indices
+    similarities = np.concatenate(sim_chunks) if sim_chunks else np.zeros(0, dtype=np.float64)
+    return indptr, indices, similarities
+
+def neighbor_lists(data, eps, memory_bytes=BLOCK_MEMORY_BYTES, spill_path=None, normalized=False, transposed=None):
+    """
+    Computes every point's eps-neighborhood under cosine distance.
+    Rows are L2-normalized once (unless `normalized`) and compared block by
+    block, so at most `memory_bytes` of similarities are held at a time.
+    `transposed` is the normalized rows' transpose in CSR form, e.g. a
+    memory-mapped one; it is built in memory otherwise. With `spill_path`
+    the indices are written there and memory-mapped instead of kept in memory.
+    Returns (indptr, indices) in CSR layout: the neighbors of point i are
+    indices[indptr[i]:indptr[i + 1]], in ascending order, including i itself.
+    """
+    return _blocked_neighbors(data, eps, memory_bytes, keep_similarities=False, spill_path=spill_path,
+                              normalized=normalized, transposed=transposed)
+
+def neighbor_graph(data, max_eps=GRAPH_MAX_EPS, memory_bytes=BLOCK_MEMORY_BYTES):
+    """
+    Reusable neighbor structure for re-clustering: every pair within
+    `max_eps`, with its cosine similarity, each row sorted from nearest to
+    farthest. Any eps <= max_eps can then be clustered with
+    `dbscan_from_graph` without computing a single distance again.
+    Returns (indptr, indices, similarities) in CSR layout.
+    """
+    indptr, indices, similarities = _blocked_neighbors(data, max_eps, memory_bytes, keep_similarities=True)
+    # Sort each row by descending similarity (row-major lexsort keeps rows together)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.lexsort((indices, -similarities, rows))
+    return indptr, indices[order], similarities[order]
+
+def graph_neighbors(graph, eps):
+    """(indptr, indices) of the eps-neighborhoods contained in a `neighbor_graph`, in O(edges)."""
+    indptr, indices, similarities = graph
+    keep = similarities >= 1.0 - eps
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    counts = np.bincount(rows[keep], minlength=len(indptr) - 1)
+    kept_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(counts, out=kept_indptr[1:])
+    return kept_indptr, indices[keep]
+
+def lsh_bits_for_size(n_rows, bucket_rows=LSH_BUCKET_ROWS):
+    """Bits per table that split `n_rows` rows into buckets of about `bucket_rows` rows."""
+    return max(1, int(np.ceil(np.log2(max(n_rows, 1) / bucket_rows))))
+
+def lsh_recall(similarity, n_bits, n_tables=LSH_TABLES):
+    """
+    Probability that two points with the given cosine similarity share a
+    bucket in at least one of `n_tables` random-hyperplane tables, i.e. the
+    chance that `lsh_neighbor_lists` finds that pair.
+    """
+    angle = np.arccos(np.clip(similarity, -1.0, 1.0))
+    collide = (1.0 - angle / np.pi) ** n_bits
+    return 1.0 - (1.0 - collide) ** n_tables
+
+def lsh_tables_for_recall(eps, recall, n_bits):
+    """Fewest tables that find a pair at exactly distance `eps` with probability >= `recall`."""
+    collide = lsh_recall(1.0 - eps, n_bits=n_bits, n_tables=1)
+    if collide >= 1.0:
+        return 1
+    if collide <= 0.0:
+        raise ValueError(f"No number of tables reaches recall {recall} at eps={eps}")
+    return max(1, int(np.ceil(np.log(1.0 - recall) / np.log(1.0 - collide))))
+
+def lsh_buckets(unit, n_tables=LSH_TABLES, n_bits=None, seed=0, group_rows=LSH_GROUP_ROWS):
+    """
+    Random-hyperplane LSH over unit-norm rows: each table hashes every
+    non-zero row to the signs of `n_bits` random projections (by default
+    `lsh_bits_for_size` of the row count).
+    Buckets with two or more members are returned in groups of roughly
+    `group_rows` rows so small buckets share one matrix multiply: a list of
+    (table, rows, bucket_keys) triples, where two rows of a group are
+    candidates only if their keys are equal. Each row appears at most once
+    per table. Also returns every row's key in every table, an (n, n_tables)
+    array with -1 for all-zero rows.
+    """
+    if sp.issparse(unit):
+        unit = sp.csr_matrix(unit)
+        nonzero = np.flatnonzero(unit.getnnz(axis=1))
+    else:
+        nonzero = np.flatnonzero(np.any(unit, axis=1))
+    hashed = unit[nonzero]
+    if n_bits is None:
+        n_bits = lsh_bits_for_size(unit.shape[0])
+    rng = np.random.default_rng(seed)
+    weights = 1 << np.arange(n_bits, dtype=np.int64)
+    groups = []
+    table_keys = np.full((unit.shape[0], n_tables), -1, dtype=np.int64)
+    for table in range(n_tables):
+        planes = rng.standard_normal((unit.shape[1], n_bits))
+        keys = (np.asarray(hashed @ planes) > 0) @ weights
+        table_keys[nonzero, table] = keys
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        sizes = np.diff(np.r_[0, np.flatnonzero(np.diff(sorted_keys)) + 1, len(order)])
+        shared = np.repeat(sizes > 1, sizes)
+        rows, row_keys = nonzero[order[shared]], sorted_keys[shared]
+        # Cut groups at bucket boundaries once they reach group_rows
+        start = 0
+        for end in np.cumsum(sizes[sizes > 1]):
+            if end - start >= group_rows:
+                groups.append((table, rows[start:end], row_keys[start:end]))
+                start = end
+        if start < len(rows):
+            groups.append((table, rows[start:], row_keys[start:]))
+    return groups, table_keys
+
+def _bucket_blocks(unit, rows, row_keys, cols, col_keys, min_sim, memory_bytes):
+    """
+    Yields (row offset, boolean block) marking the rows x cols pairs that
+    share a bucket and have similarity >= min_sim, within the memory budget.
+    """
+    block = block_rows_for_budget(len(cols), memory_bytes)
+    targets = unit[cols].T
+    for start in range(0, len(rows), block):
+        sims = unit[rows[start:start + block]] @ targets
+        if sp.issparse(sims):
+            sims = sims.toarray()
+        yield start, (sims >= min_sim) & (row_keys[start:start + block, None] == col_keys[None, :])
+
+def lsh_dbscan(data, eps, min_pts, n_tables=LSH_TABLES, n_bits=None, seed=0, memory_bytes=BLOCK_MEMORY_BYTES,
+               normalized=False):
+    """
+    Approximate DBSCAN whose neighborhoods come from LSH buckets.
+    Only rows sharing a bucket are compared, and each candidate pair is
+    checked against the exact similarity, so points can miss neighbors but
+    never gain false ones (see `lsh_recall` for the chance of finding a pair).
+    No neighbor lists are stored: one pass over the buckets counts
+    neighbors (a pair is counted in the first table where it shares a
+    bucket, so a point's count is the union over tables), one links core
+    points into clusters and one attaches border points to the lowest
+    numbered cluster they reach, as `dbscan_reference` does.
+    Each table compares about n * bucket rows pairs, and the bits per table
+    grow with log2(n) by default so buckets do not grow with n. Recall at a
+    fixed eps then needs more tables as n grows, so total work is
+    n^(1 + rho) with rho = log(p_eps) / log(p_far) per bit; at large eps
+    (low similarity) rho approaches 1 and the exact search is faster.
+    Memory stays O(n * n_tables). With n_bits=0 there is a single bucket
+    and the result is exact. `normalized` rows are used without a copy.
+    Returns (labels, neighbor_counts).
+    """
+    min_sim = 1.0 - eps
+    if min_sim <= 0:
+        # Every pair is within eps, hashing cannot prune anything
+        indptr, indices = neighbor_lists(data, eps, memory_bytes=memory_bytes, normalized=normalized)
+        return dbscan_from_neighbors(indptr, indices, min_pts), np.diff(indptr)
+    unit = data if normalized else normalize_rows(data)
+    n = unit.shape[0]
+    groups, table_keys = lsh_buckets(unit, n_tables=n_tables, n_bits=n_bits, seed=seed)
+
+    # Every non-zero row is its own neighbor; all-zero rows have none
+    if sp.issparse(unit):
+        counts = (unit.getnnz(axis=1) > 0).astype(np.int64)
+    else:
+        counts = np.any(unit, axis=1).astype(np.int64)
+    for table, members, keys in groups:
+        for start, close in _bucket_blocks(unit, members, keys, members, keys, min_sim, memory_bytes):
+            r, c = np.nonzero(close)
+            rows, cols = members[start + r], members[c]
+            # Skip self pairs and pairs that already shared a bucket in an earlier table
+            first = rows != cols
+            if table:
+                first &= ~np.any(table_keys[rows, :table] == table_keys[cols, :table], axis=1)
+            counts += np.bincount(rows[first], minlength=n)
+    is_core = counts >= min_pts
+
+    # Core points linked in any bucket end up in the same cluster
+    edge_rows, edge_cols = [np.flatnonzero(is_core)], [np.flatnonzero(is_core)]
+    for _, members, keys in groups:
+        cores, core_keys = members[is_core[members]], keys[is_core[members]]
+        if len(cores) < 2:
+            continue
+        rows, cols = [], []
+        for start, close in _bucket_blocks(unit, cores, core_keys, cores, core_keys, min_sim, memory_bytes):
+            r, c = np.nonzero(close)
+            rows.append(start + r)
+            cols.append(c)
+        adjacency = sp.coo_matrix((np.ones(sum(len(r) for r in rows), dtype=bool),
+                                   (np.concatenate(rows), np.concatenate(cols))), shape=(len(cores), len(cores)))
+        # Keep the group's connectivity with one edge per core point
+        _, component = connected_components(adjacency, directed=False)
+        _, first = np.unique(component, return_index=True)
+        edge_rows.append(cores)
+        edge_cols.append(cores[first[component]])
+    graph = sp.coo_matrix((np.ones(sum(len(r) for r in edge_rows), dtype=bool),
+                           (np.concatenate(edge_rows), np.concatenate(edge_cols))), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+
+    # Clusters are numbered in order of their first core point, as seeds are visited
+    labels = np.full(n, -1, dtype=np.int64)
+    core_idx = np.flatnonzero(is_core)
+    _, first = np.unique(component[core_idx], return_index=True)
+    cluster_of = np.zeros(component.max() + 1, dtype=np.int64)
+    cluster_of[component[core_idx[np.sort(first)]]] = np.arange(1, len(first) + 1)
+    labels[core_idx] = cluster_of[component[core_idx]]
+
+    # Border points join the lowest numbered cluster among the core points they reach
+    border = np.full(n, np.iinfo(np.int64).max)
+    for _, members, keys in groups:
+        cores, core_keys = members[is_core[members]], keys[is_core[members]]
+        others, other_keys = members[~is_core[members]], keys[~is_core[members]]
+        if not len(cores) or not len(others):
+            continue
+        core_labels = labels[cores]
+        for start, close in _bucket_blocks(unit, others, other_keys, cores, core_keys, min_sim, memory_bytes):
+            reached = np.where(close, core_labels[None, :], np.iinfo(np.int64).max).min(axis=1)
+            rows = others[start:start + len(close)]
+            border[rows] = np.minimum(border[rows], reached)
+    attached = ~is_core & (border < np.iinfo(np.int64).max)
+    labels[attached] = border[attached]
+    return labels.tolist(), counts
+
+def adjusted_rand_index(labels_a, labels_b):
+    """
+    Adjusted Rand index between two labelings (1.0 = identical partitions).
+    Noise (-1) is treated as one more group.
+    """
+    labels_a, labels_b = np.asarray(labels_a), np.asarray(labels_b)
+    n = len(labels_a)
+    if n < 2:
+        return 1.0
+    _, a = np.unique(labels_a, return_inverse=True)
+    _, b = np.unique(labels_b, return_inverse=True)
+    contingency = sp.coo_matrix((np.ones(n), (a, b))).tocsr()
+    pairs = lambda counts: float(np.sum(counts * (counts - 1)) / 2)
+    index = pairs(contingency.data)
+    rows = pairs(np.asarray(contingency.sum(axis=1)).ravel())
+    cols = pairs(np.asarray(contingency.sum(axis=0)).ravel())
+    expected = rows * cols / (n * (n - 1) / 2)
+    maximum = (rows + cols) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
+
 def expand_cluster(data, labels, idx, neighbors, cluster_id, eps, min_pts):
     labels[idx] = cluster_id
     i = 0
@@ -27,7 +341,11 @@ def expand_cluster(data, labels, idx, neighbors, cluster_id, eps, min_pts):
                 neighbors.extend(new_neighbors)
         i += 1
 
-def dbscan_cosine(data, eps, min_pts):
+def dbscan_reference(data, eps, min_pts):
+    """
+    Pure-Python DBSCAN, one `cosine_distance` call per pair.
+    Kept as the reference that `dbscan_cosine` must agree with.
+    """
     # labels: 0=unvisited, -1=noise, >0=cluster_id
     labels = [0] * len(data)
     cluster_id = 0
@@ -40,4 +358,117 @@ def dbscan_cosine(data, eps, min_pts):
         else:
             cluster_id += 1
             expand_cluster(data, labels, idx, neighbors, cluster_id, eps, min_pts)
-    return labels
\ No newline at end of file
+    return labels
+
+def dbscan_from_neighbors(indptr, indices, min_pts):
+    """
+    Runs DBSCAN over precomputed neighbor lists (see `neighbor_lists`).
+    Seeds are visited in index order and a border point goes to the first
+    cluster that reaches it, which reproduces `dbscan_reference` exactly.
+    """
+    n = len(indptr) - 1
+    is_core = np.diff(indptr) >= min_pts
+    # labels: 0=unvisited, -1=noise, >0=cluster_id
+    labels = np.zeros(n, dtype=np.int64)
+    cluster_id = 0
+    for idx in range(n):
+        if labels[idx] != 0:
+            continue
+        if not is_core[idx]:
+            labels[idx] = -1 # Mark as noise
+            continue
+        cluster_id += 1
+        labels[idx] = cluster_id
+        queue = [idx]
+        while queue:
+            point = queue.pop()
+            if not is_core[point]:
+                continue
+            neighbors = indices[indptr[point]:indptr[point + 1]]
+            # Unvisited and noise points both join the cluster; only
+            # core points among them are expanded further.
+            claimed = neighbors[labels[neighbors] <= 0]
+            labels[claimed] = cluster_id
+            queue.extend(claimed.tolist())
+    return labels.tolist()
+
+def dbscan_cosine(data, eps, min_pts, memory_bytes=BLOCK_MEMORY_BYTES, approximate=False,
+                  n_tables=LSH_TABLES, n_bits=None, seed=0, recall=None, spill_path=None, normalized=False,
+                  transposed=None):
+    """
+    DBSCAN under cosine distance. With `approximate=True` it runs
+    `lsh_dbscan` (candidate pairs from LSH buckets, recall tuned with
+    n_tables/n_bits) instead of the exact all-pairs neighbor search; it only
+    beats the exact search at small eps. A target `recall` overrides
+    n_tables with `lsh_tables_for_recall(eps, recall, n_bits)`. The exact
+    search spills its neighbor lists to `spill_path` when given. Rows that
+    are already unit-norm (`normalized`, with their `transposed` CSR for the
+    exact search) are read as they are, without normalized copies.
+    """
+    # labels: -1=noise, >0=cluster_id
+    if np.shape(data)[0] == 0:
+        return []
+    if approximate:
+        if n_bits is None:
+            n_bits = lsh_bits_for_size(np.shape(data)[0])
+        if recall is not None:
+            n_tables = lsh_tables_for_recall(eps, recall, n_bits=n_bits)
+        labels, _ = lsh_dbscan(data, eps, min_pts, n_tables=n_tables, n_bits=n_bits, seed=seed,
+                               memory_bytes=memory_bytes, normalized=normalized)
+        return labels
+    indptr, indices = neighbor_lists(data, eps, memory_bytes=memory_bytes, spill_path=spill_path,
+                                     normalized=normalized, transposed=transposed)
+    return dbscan_from_neighbors(indptr, indices, min_pts)
+
+def dbscan_from_graph(graph, eps, min_pts):
+    """
+    DBSCAN labels for any eps up to the graph's max_eps and any min_pts,
+    read from a `neighbor_graph` in time linear in its edges. Matches
+    `dbscan_cosine` on the same data.
+    """
+    indptr, indices = graph_neighbors(graph, eps)
+    if len(indptr) == 1:
+        return []
+    return dbscan_from_neighbors(indptr, indices, min_pts)
+
+def compare_neighbor_modes(data, eps, min_pts, n_tables=LSH_TABLES, n_bits=None, seed=0,
+                           memory_bytes=BLOCK_MEMORY_BYTES, recall=None):
+    """
+    Runs exact and LSH DBSCAN on the same data and reports how far apart
+    they are: wall and CPU timings, the share of exact neighbors and core points LSH
+    found, the adjusted Rand index of the labels and both cluster/noise counts.
+    A target `recall` derives n_tables as in `dbscan_cosine`.
+    """
+    if n_bits is None:
+        n_bits = lsh_bits_for_size(np.shape(data)[0])
+    if recall is not None:
+        n_tables = lsh_tables_for_recall(eps, recall, n_bits=n_bits)
+    started, started_cpu = time.perf_counter(), time.process_time()
+    indptr, indices = neighbor_lists(data, eps, memory_bytes=memory_bytes)
+    exact_labels = dbscan_from_neighbors(indptr, indices, min_pts)
+    exact_s, exact_cpu_s = time.perf_counter() - started, time.process_time() - started_cpu
+    started, started_cpu = time.perf_counter(), time.process_time()
+    approx_labels, approx_counts = lsh_dbscan(data, eps, min_pts, n_tables=n_tables, n_bits=n_bits, seed=seed,
+                                              memory_bytes=memory_bytes)
+    approx_s, approx_cpu_s = time.perf_counter() - started, time.process_time() - started_cpu
+    exact_counts = np.diff(indptr)
+    exact_core = exact_counts >= min_pts
+    return {
+        "n_docs": len(exact_labels),
+        "eps": eps,
+        "min_pts": min_pts,
+        "n_tables": n_tables,
+        "n_bits": n_bits,
+        "exact_s": exact_s,
+        "approx_s": approx_s,
+        "exact_cpu_s": exact_cpu_s,
+        "approx_cpu_s": approx_cpu_s,
+        "neighbor_recall": float(approx_counts.sum() / exact_counts.sum()) if exact_counts.sum() else 1.0,
+        "core_recall": float((approx_counts[exact_core] >= min_pts).mean()) if exact_core.any() else 1.0,
+        "boundary_recall": float(lsh_recall(1.0 - eps, n_bits, n_tables)),
+        "adjusted_rand_index": adjusted_rand_index(exact_labels, approx_labels),
+        "exact_clusters": len(set(exact_labels) - {-1}),
+        "approx_clusters": len(set(approx_labels) - {-1}),
+        "exact_noise": exact_labels.count(-1),
+        "approx_noise": approx_labels.count(-1),
+    }
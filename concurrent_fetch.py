@@ -0,0 +1,59 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from corpus_cache import REFRESH_AUTO, get_default_cache
+from data_fetch import BASE_URL, RESULTS_PER_CALL, get_default_limiter, load_window
+
+def _assemble_year(windows):
+    """Concatenates a year's windows in start order, stopping at the first empty one."""
+    papers = []
+    for start in sorted(windows):
+        if not windows[start]:
+            break
+        papers.extend(windows[start])
+    return pd.DataFrame(papers)
+
+def fetch_years_concurrent(category, years, max_results=200, max_workers=4, cache=None, use_cache=True,
+                           refresh=REFRESH_AUTO, base_url=BASE_URL, limiter=None):
+    """
+    Fetches several years of a category at once on a thread pool.
+    Every page of every year goes through one shared rate limiter (and the
+    corpus cache), and (year, DataFrame) pairs are yielded as soon as all
+    pages of a year are in, so callers can start preprocessing early.
+    The DataFrames match what `fetch_arxiv_year` returns for each year.
+    """
+    if use_cache and cache is None:
+        cache = get_default_cache()
+    if not use_cache:
+        cache = None
+    limiter = limiter or get_default_limiter()
+    years = list(years)
+    windows = {year: {} for year in years}
+    pending = {}
+    pending_per_year = {year: 0 for year in years}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit(year, start):
+            future = pool.submit(load_window, category, year, start, RESULTS_PER_CALL, cache, refresh, base_url, limiter)
+            pending[future] = (year, start)
+            pending_per_year[year] += 1
+
+        for year in years:
+            if max_results > 0:
+                submit(year, 0)
+            else:
+                yield year, pd.DataFrame()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                year, start = pending.pop(future)
+                pending_per_year[year] -= 1
+                papers, total = future.result()
+                windows[year][start] = papers
+                # The first page tells us how many more pages exist; request them all at once
+                if start == 0 and papers:
+                    last = max_results if total is None else min(max_results, total)
+                    for next_start in range(RESULTS_PER_CALL, last, RESULTS_PER_CALL):
+                        submit(year, next_start)
+                if pending_per_year[year] == 0:
+                    yield year, _assemble_year(windows[year])
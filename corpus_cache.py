@@ -0,0 +1,185 @@
+import io
+import os
+import sqlite3
+import time
+from datetime import datetime
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "arxiv_corpus.sqlite")
+
+# Refresh policies for cached result windows
+REFRESH_AUTO = "auto"      # years fetched once complete never expire, running years expire after a TTL
+REFRESH_ALWAYS = "always"  # ignore cached windows and download them again
+REFRESH_NEVER = "never"    # cached windows never expire, whatever the year
+REFRESH_POLICIES = (REFRESH_AUTO, REFRESH_ALWAYS, REFRESH_NEVER)
+
+CURRENT_YEAR_TTL_SECONDS = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS windows (
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    window_start INTEGER NOT NULL,
+    window_size INTEGER NOT NULL,
+    n_entries INTEGER NOT NULL,
+    total_results INTEGER,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (category, year, window_start, window_size)
+);
+CREATE TABLE IF NOT EXISTS papers (
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    window_start INTEGER NOT NULL,
+    window_size INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    published TEXT NOT NULL,
+    PRIMARY KEY (category, year, window_start, window_size, position)
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    scheme TEXT NOT NULL,
+    corpus_version TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (category, year, scheme)
+);
+"""
+
+class CorpusCache:
+    """
+    On-disk SQLite store of arXiv API result windows, one row per
+    (category, year, start, size) window plus the papers it returned.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, current_year_ttl=CURRENT_YEAR_TTL_SECONDS):
+        self.path = path
+        self.current_year_ttl = current_year_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # A fresh connection per call keeps the cache safe to share between threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def is_fresh(self, year, fetched_at, refresh=REFRESH_AUTO, now=None):
+        """Decides whether a window fetched at `fetched_at` can be served under `refresh`."""
+        if refresh not in REFRESH_POLICIES:
+            raise ValueError(f"Unknown refresh policy: {refresh}")
+        if refresh == REFRESH_ALWAYS:
+            return False
+        if refresh == REFRESH_NEVER:
+            return True
+        now = time.time() if now is None else now
+        # A window fetched after its year ended can no longer change, so it never expires;
+        # one fetched while the year was running expires like the current year's
+        if year < datetime.fromtimestamp(fetched_at).year:
+            return True
+        return now - fetched_at < self.current_year_ttl
+
+    def get_window(self, category, year, start, size, refresh=REFRESH_AUTO):
+        """
+        Returns (papers, total_results) for a cached, still-fresh window,
+        or None if the window has to be fetched.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fetched_at, total_results FROM windows "
+                "WHERE category = ? AND year = ? AND window_start = ? AND window_size = ?",
+                (category, year, start, size)
+            ).fetchone()
+            if row is None or not self.is_fresh(year, row[0], refresh):
+                return None
+            rows = conn.execute(
+                "SELECT id, title, abstract, published FROM papers "
+                "WHERE category = ? AND year = ? AND window_start = ? AND window_size = ? "
+                "ORDER BY position",
+                (category, year, start, size)
+            ).fetchall()
+        papers = [
+            {"id": pid, "title": title, "abstract": abstract, "published": datetime.fromisoformat(published)}
+            for pid, title, abstract, published in rows
+        ]
+        return papers, row[1]
+
+    def put_window(self, category, year, start, size, papers, total_results=None):
+        """Stores (or replaces) one fetched window atomically."""
+        key = (category, year, start, size)
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM papers WHERE category = ? AND year = ? AND window_start = ? AND window_size = ?", key
+            )
+            conn.executemany(
+                "INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [key + (pos, p["id"], p["title"], p["abstract"], p["published"].isoformat())
+                 for pos, p in enumerate(papers)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                key + (len(papers), total_results, time.time())
+            )
+
+    def get_signatures(self, category, year, corpus_version, scheme):
+        """
+        MinHash signatures (see dedup.py) stored for this version of a
+        category/year under a signature `scheme`, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM signatures "
+                "WHERE category = ? AND year = ? AND scheme = ? AND corpus_version = ?",
+                (category, year, scheme, corpus_version)
+            ).fetchone()
+        if row is None:
+            return None
+        return np.load(io.BytesIO(row[0]), allow_pickle=False)
+
+    def put_signatures(self, category, year, corpus_version, scheme, signatures):
+        """Stores (or replaces) a year's signatures."""
+        buffer = io.BytesIO()
+        np.save(buffer, signatures)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?, ?)",
+                (category, year, scheme, corpus_version, buffer.getvalue(), time.time())
+            )
+
+    def windows(self, category, year):
+        """Lists the retrieved windows for a category/year as dicts, ordered by start."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT window_start, window_size, n_entries, total_results, fetched_at FROM windows "
+                "WHERE category = ? AND year = ? ORDER BY window_start",
+                (category, year)
+            ).fetchall()
+        keys = ("start", "size", "n_entries", "total_results", "fetched_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def clear(self, category=None, year=None):
+        """Drops cached windows, optionally only for one category and/or year."""
+        where, params = [], []
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+        if year is not None:
+            where.append("year = ?")
+            params.append(year)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM papers{clause}", params)
+            conn.execute(f"DELETE FROM windows{clause}", params)
+            conn.execute(f"DELETE FROM signatures{clause}", params)
+
+_default_cache = None
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CorpusCache()
+    return _default_cache
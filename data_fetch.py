@@ -1,38 +1,169 @@
+import http.client
+import multiprocessing
+import threading
+import time
 import feedparser
 import pandas as pd
 from datetime import datetime
+from corpus_cache import REFRESH_AUTO, get_default_cache
 
-def fetch_arxiv_year(category, year, max_results=200):
+BASE_URL = "http://export.arxiv.org/api/query?"
+RESULTS_PER_CALL = 100
+# ArXiv asks API clients to leave at least 3 seconds between requests
+ARXIV_MIN_INTERVAL = 3.0
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2.0
+
+class RateLimiter:
+    """
+    Spaces out calls to `wait()` by at least `min_interval` seconds,
+    across every thread that shares the limiter.
+    """
+
+    def __init__(self, min_interval=ARXIV_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _reserve(self):
+        """Takes the next free slot; returns (slot, now)."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        return slot, now
+
+    def wait(self):
+        slot, now = self._reserve()
+        if slot > now:
+            time.sleep(slot - now)
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose next free slot lives in shared memory, so every
+    process it is handed to at start-up (e.g. through a pool initializer
+    calling `set_default_limiter`) keeps the same spacing.
+    """
+
+    def __init__(self, min_interval=ARXIV_MIN_INTERVAL, context=None):
+        context = context or multiprocessing.get_context("spawn")
+        self.min_interval = min_interval
+        self._next_slot = context.Value("d", 0.0)
+
+    def _reserve(self):
+        # time.monotonic is system-wide on Linux, so slots compare across processes
+        with self._next_slot.get_lock():
+            now = time.monotonic()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self.min_interval
+        return slot, now
+
+_default_limiter = RateLimiter()
+
+def get_default_limiter():
+    return _default_limiter
+
+def set_default_limiter(limiter):
+    """Replaces this process's default limiter, e.g. with a SharedRateLimiter in a worker process."""
+    global _default_limiter
+    _default_limiter = limiter
+
+def _total_results(feed):
+    """Total hits reported by the feed (opensearch:totalResults), or None if absent."""
+    try:
+        return int(feed.feed.get("opensearch_totalresults"))
+    except (TypeError, ValueError):
+        return None
+
+def _is_transient_failure(feed):
+    """True for throttled/failed responses and for empty pages without a result count."""
+    status = feed.get("status")
+    if status is not None and (status == 429 or status >= 500):
+        return True
+    return not feed.entries and _total_results(feed) is None
+
+def fetch_feed(url, limiter=None, retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    """
+    Parses an API URL, waiting on the shared rate limiter before every attempt
+    and retrying transient failures and connection errors with exponential
+    backoff. A connection error of the last attempt is raised.
+    """
+    limiter = limiter or get_default_limiter()
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            feed = feedparser.parse(url)
+        except (OSError, http.client.HTTPException):
+            # Dropped connections, timeouts and URLErrors
+            if attempt == retries:
+                raise
+        else:
+            if not _is_transient_failure(feed) or attempt == retries:
+                return feed
+        time.sleep(backoff * (2 ** attempt))
+
+def fetch_window(category, year, start, size=RESULTS_PER_CALL, base_url=BASE_URL, limiter=None):
+    """
+    Downloads one page of results from the ArXiv API.
+    Returns (papers, total_results) where papers is a list of dicts.
+    """
+    query = f"search_query=cat:{category}+AND+submittedDate:[{year}01010000+TO+{year}12312359]"
+    url = f"{base_url}{query}&start={start}&max_results={size}&sortBy=submittedDate&sortOrder=ascending"
+
+    feed = fetch_feed(url, limiter=limiter)
+    papers = []
+    for entry in feed.entries:
+        try:
+            published = datetime.strptime(entry.published, "%Y-%m-%dT%H:%M:%SZ")
+            papers.append({
+                "id": entry.id,
+                "title": entry.title.strip().replace("\n", " "),
+                "abstract": entry.summary.strip().replace("\n", " "),
+                "published": published
+            })
+        except ValueError:
+            print(f"Skipping entry with invalid date format: {entry.published}")
+            continue
+    return papers, _total_results(feed)
+
+def load_window(category, year, start, size=RESULTS_PER_CALL, cache=None, refresh=REFRESH_AUTO,
+                base_url=BASE_URL, limiter=None):
+    """
+    Returns (papers, total_results) for one window, from `cache` when it holds a
+    fresh copy and from the API otherwise. Pass cache=None to always download.
+    """
+    cached = cache.get_window(category, year, start, size, refresh) if cache is not None else None
+    if cached is not None:
+        return cached
+    papers, total = fetch_window(category, year, start, size, base_url=base_url, limiter=limiter)
+    # An empty page is only cached when the feed confirms the results ended there;
+    # otherwise it may be a transient API failure.
+    if cache is not None and (papers or (total is not None and start >= total)):
+        cache.put_window(category, year, start, size, papers, total)
+    return papers, total
+
+def fetch_arxiv_year(category, year, max_results=200, cache=None, use_cache=True, refresh=REFRESH_AUTO,
+                     base_url=BASE_URL, limiter=None):
     """
     Fetch papers from ArXiv for a given category and year.
     Returns a DataFrame with id, title, abstract, published.
+    Result windows are read from the local corpus cache first and only
+    missing or expired ones are downloaded (see corpus_cache.CorpusCache).
     """
-    base_url = "http://export.arxiv.org/api/query?"
+    if use_cache and cache is None:
+        cache = get_default_cache()
     start = 0
-    results_per_call = 100
     papers = []
 
     while start < max_results:
-        query = f"search_query=cat:{category}+AND+submittedDate:[{year}01010000+TO+{year}12312359]"
-        url = f"{base_url}{query}&start={start}&max_results={results_per_call}&sortBy=submittedDate&sortOrder=ascending"
+        window, total = load_window(category, year, start, RESULTS_PER_CALL, cache if use_cache else None,
+                                    refresh, base_url, limiter)
+        if not window:
+            break
 
-        feed = feedparser.parse(url)
-        if not feed.entries:
+        papers.extend(window)
+        start += RESULTS_PER_CALL
+        if total is not None and start >= total:
             break
 
-        for entry in feed.entries:
-            try:
-                published = datetime.strptime(entry.published, "%Y-%m-%dT%H:%M:%SZ")
-                papers.append({
-                    "id": entry.id,
-                    "title": entry.title.strip().replace("\n", " "),
-                    "abstract": entry.summary.strip().replace("\n", " "),
-                    "published": published
-                })
-            except ValueError:
-                print(f"Skipping entry with invalid date format: {entry.published}")
-                continue
-        
-        start += results_per_call
-
-    return pd.DataFrame(papers)
\ No newline at end of file
+    return pd.DataFrame(papers)
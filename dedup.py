@@ -0,0 +1,163 @@
+"""
+Near-duplicate and cross-listing removal between fetching and preprocessing.
+
+A paper is dropped when its arXiv id without the version suffix
+(http://arxiv.org/abs/2101.00001v2 -> 2101.00001) was already kept, or when
+its abstract is a near-duplicate of a kept one: MinHash signatures over word
+shingles estimate the Jaccard similarity, and LSH banding only compares
+papers that share a band, so a year is deduplicated in near-linear time.
+Years are deduplicated in order, each against itself and every earlier year,
+so the first copy of a paper is the one kept.
+
+Signatures are cached per year in the corpus cache (see corpus_cache.py)
+and keyed by the year's paper ids, so re-runs skip the hashing.
+"""
+import re
+import zlib
+import numpy as np
+
+from corpus_cache import get_default_cache
+from results_store import corpus_version
+
+# Estimated Jaccard similarity of the abstracts' shingles above which two papers are duplicates
+DEDUP_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+# 16 bands of 4 rows: pairs at the threshold share a band with probability > 0.999
+LSH_BANDS = 16
+SEED = 1
+# Shingle hashes minhashed at once, bounding the (NUM_PERM x chunk) working array
+MINHASH_CHUNK = 65536
+
+# Largest prime below 2**32: the permutations are (a * x + b) mod _PRIME on 32-bit hashes
+_PRIME = 4294967291
+# Rolls the word hashes of a shingle into one: small enough that products stay below 2**64
+_SHINGLE_MULTIPLIER = np.uint64(1000003)
+_WORD = re.compile(r"[a-z0-9]+")
+_ID_PREFIX = re.compile(r"^.*/abs/")
+_ID_VERSION = re.compile(r"v\d+$")
+
+def canonical_id(paper_id):
+    """arXiv id without its URL prefix and version suffix, e.g. 2101.00001 or cs/0101001."""
+    return _ID_VERSION.sub("", _ID_PREFIX.sub("", paper_id.strip()))
+
+def shingle_hashes(text, size=SHINGLE_SIZE, word_hashes=None):
+    """
+    32-bit hashes of the word `size`-grams of a text (one shingle if it is
+    shorter), rolled from the words' CRC32s. `word_hashes` is a {word: crc}
+    memo shared between texts.
+    """
+    words = _WORD.findall(text.lower()) if isinstance(text, str) else []
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    word_hashes = {} if word_hashes is None else word_hashes
+    codes = []
+    for word in words:
+        code = word_hashes.get(word)
+        if code is None:
+            code = word_hashes[word] = zlib.crc32(word.encode("utf-8"))
+        codes.append(code)
+    codes = np.array(codes, dtype=np.uint64)
+    width = min(size, len(codes))
+    n_shingles = len(codes) - width + 1
+    shingles = codes[:n_shingles].copy()
+    for offset in range(1, width):
+        shingles = (shingles * _SHINGLE_MULTIPLIER + codes[offset:offset + n_shingles]) & 0xFFFFFFFF
+    return shingles
+
+def _permutations(num_perm=NUM_PERM, seed=SEED):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signatures(texts, num_perm=NUM_PERM, seed=SEED):
+    """
+    (n_texts x num_perm) uint32 MinHash signatures. Shingle hashes of many
+    texts are permuted together and reduced per text; a text without words
+    gets an all-_PRIME signature, which `Deduplicator` never matches.
+    """
+    a, b = _permutations(num_perm, seed)
+    word_hashes = {}
+    hashes = [shingle_hashes(text, word_hashes=word_hashes) for text in texts]
+    signatures = np.full((len(hashes), num_perm), _PRIME, dtype=np.uint64)
+    start = 0
+    while start < len(hashes):
+        # Texts whose shingles fit in one chunk (at least one text per chunk)
+        stop, total = start, 0
+        while stop < len(hashes) and (stop == start or total + len(hashes[stop]) <= MINHASH_CHUNK):
+            total += len(hashes[stop])
+            stop += 1
+        rows = [row for row in range(start, stop) if len(hashes[row])]
+        if rows:
+            flat = np.concatenate([hashes[row] for row in rows])
+            offsets = np.cumsum([0] + [len(hashes[row]) for row in rows[:-1]])
+            permuted = (a[:, None] * flat[None, :] + b[:, None]) % _PRIME
+            signatures[rows] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = stop
+    return signatures.astype(np.uint32)
+
+class Deduplicator:
+    """
+    Streaming deduplicator over the years of one category. `filter_year`
+    must be called in year order: every paper is checked against the papers
+    kept so far and added to the LSH buckets if it is kept.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, cache=None, num_perm=NUM_PERM, bands=LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.cache = cache if cache is not None else get_default_cache()
+        self.num_perm = num_perm
+        self.bands = bands
+        self.scheme = f"k{SHINGLE_SIZE}-p{num_perm}-s{SEED}"
+        self.seen_ids = set()
+        self.kept = []
+        self.buckets = [{} for _ in range(bands)]
+
+    def signatures(self, category, year, df):
+        """The year's MinHash signatures, from the corpus cache when its papers are unchanged."""
+        version = corpus_version({year: df["id"].tolist()})
+        signatures = self.cache.get_signatures(category, year, version, self.scheme)
+        if signatures is None:
+            signatures = minhash_signatures(df["abstract"], num_perm=self.num_perm)
+            self.cache.put_signatures(category, year, version, self.scheme, signatures)
+        return signatures
+
+    def _is_near_duplicate(self, signature, band_keys):
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self.buckets[band].get(key, ()))
+        for candidate in candidates:
+            if np.mean(self.kept[candidate] == signature) >= self.threshold:
+                return True
+        return False
+
+    def filter_year(self, category, year, df):
+        """
+        Returns (kept rows of `df`, number of dropped papers). Rows are kept
+        in their original order.
+        """
+        if df.empty:
+            return df, 0
+        signatures = self.signatures(category, year, df)
+        rows_per_band = self.num_perm // self.bands
+        keep = []
+        for row, (paper_id, signature) in enumerate(zip(df["id"], signatures)):
+            canonical = canonical_id(paper_id)
+            if canonical in self.seen_ids:
+                continue
+            # Papers without words are kept but never indexed
+            has_words = bool(signature[0] != _PRIME)
+            band_keys = [signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes()
+                         for band in range(self.bands)] if has_words else []
+            if has_words and self._is_near_duplicate(signature, band_keys):
+                continue
+            self.seen_ids.add(canonical)
+            keep.append(row)
+            if has_words:
+                for band, key in enumerate(band_keys):
+                    self.buckets[band].setdefault(key, []).append(len(self.kept))
+                self.kept.append(signature)
+        return df.iloc[keep].reset_index(drop=True), len(df) - len(keep)
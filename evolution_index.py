@@ -0,0 +1,198 @@
+"""
+Indexed topic-evolution graph over an analysis' links and cluster keywords.
+
+Nodes are (year, cluster_id) pairs sorted by year, so every year's topics
+are one contiguous slice and every link points to a higher node index.
+Links are kept twice in CSR form (outgoing and incoming, strongest first).
+Built once per analysis, the index answers these queries without scanning
+the link list:
+- `lineage`: the strongest forward or backward path of a topic,
+  precomputed for every node. It reaches the furthest year, and among
+  those paths the one with the highest cumulative similarity (the product
+  of its link similarities).
+- `reachable`: every topic a topic leads to (or comes from), with the best
+  cumulative similarity, optionally in one year only.
+- `splits` / `merges`: topics whose links branch to (or join from)
+  several comparably strong topics of the same year.
+- `find`: topics whose keywords contain every given word (inverted index).
+"""
+from collections import defaultdict
+import numpy as np
+
+# A branch of a split or merge needs at least this similarity and this share of the strongest branch's
+SPLIT_MIN_SIMILARITY = 0.3
+BRANCH_RATIO = 0.5
+
+def _link_columns(links):
+    """(source_year, source_cluster, target_year, target_cluster, similarity) arrays of a link list or LINK_DTYPE array."""
+    names = ("source_year", "source_cluster", "target_year", "target_cluster", "similarity")
+    if isinstance(links, np.ndarray):
+        return tuple(np.asarray(links[name]) for name in names)
+    return tuple(np.array([link[name] for link in links], dtype=np.float64 if name == "similarity" else np.int64)
+                 for name in names)
+
+def _csr(n_nodes, sources, targets, similarities):
+    """Edges grouped by source node, strongest first: (indptr, targets, similarities)."""
+    order = np.lexsort((-similarities, sources))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+    return indptr, targets[order], similarities[order]
+
+class EvolutionIndex:
+    """
+    Topic-evolution graph of one analysis, from its links (list of dicts or
+    LINK_DTYPE edges) and {year: {str(cluster_id): [keywords]}}.
+    """
+
+    def __init__(self, links, keywords_by_year=None, min_similarity=SPLIT_MIN_SIMILARITY, branch_ratio=BRANCH_RATIO):
+        keywords_by_year = keywords_by_year or {}
+        source_years, source_clusters, target_years, target_clusters, similarities = _link_columns(links)
+        nodes = {(int(year), int(cid)) for year, year_keywords in keywords_by_year.items() for cid in year_keywords}
+        nodes.update(zip(source_years.tolist(), source_clusters.tolist()))
+        nodes.update(zip(target_years.tolist(), target_clusters.tolist()))
+        nodes = sorted(nodes)
+        self.node_years = np.array([year for year, _ in nodes], dtype=np.int32)
+        self.node_clusters = np.array([cid for _, cid in nodes], dtype=np.int32)
+        self._node = {node: i for i, node in enumerate(nodes)}
+        self.years = sorted(set(self.node_years.tolist()))
+        starts = np.searchsorted(self.node_years, self.years)
+        # Nodes are sorted by year, so each year's topics are one slice of the node arrays
+        self.year_slices = {year: (int(start), int(stop))
+                            for year, start, stop in zip(self.years, starts, list(starts[1:]) + [len(nodes)])}
+
+        n = len(nodes)
+        sources = np.array([self._node[node] for node in zip(source_years.tolist(), source_clusters.tolist())],
+                           dtype=np.int64)
+        targets = np.array([self._node[node] for node in zip(target_years.tolist(), target_clusters.tolist())],
+                           dtype=np.int64)
+        similarities = np.asarray(similarities, dtype=np.float64)
+        self.out_indptr, self.out_nodes, self.out_similarities = _csr(n, sources, targets, similarities)
+        self.in_indptr, self.in_nodes, self.in_similarities = _csr(n, targets, sources, similarities)
+
+        self.keywords = [list(keywords_by_year.get(year, {}).get(str(cid), [])) for year, cid in nodes]
+        keyword_nodes = defaultdict(list)
+        for i, words in enumerate(self.keywords):
+            for word in set(words):
+                keyword_nodes[word.lower()].append(i)
+        self._keyword_nodes = {word: np.array(ids, dtype=np.int64) for word, ids in keyword_nodes.items()}
+
+        self._forward = self._best_lineages(forward=True)
+        self._backward = self._best_lineages(forward=False)
+        self.splits = self._branches(self.out_indptr, self.out_nodes, self.out_similarities, min_similarity, branch_ratio)
+        self.merges = self._branches(self.in_indptr, self.in_nodes, self.in_similarities, min_similarity, branch_ratio)
+
+    def __len__(self):
+        return len(self.node_years)
+
+    def _adjacency(self, forward):
+        if forward:
+            return self.out_indptr, self.out_nodes, self.out_similarities
+        return self.in_indptr, self.in_nodes, self.in_similarities
+
+    def _best_lineages(self, forward):
+        """
+        (next node, link similarity) of every node's strongest path, by
+        dynamic programming from the far end of the graph: the path reaching
+        the furthest year wins, then the highest cumulative similarity.
+        """
+        indptr, neighbors, similarities = self._adjacency(forward)
+        n = len(self)
+        reach = self.node_years.astype(np.int64) * (1 if forward else -1)
+        score = np.ones(n)
+        following = np.full(n, -1, dtype=np.int64)
+        link_similarity = np.zeros(n)
+        # Links always point to later years, i.e. higher node indices
+        for i in (range(n - 1, -1, -1) if forward else range(n)):
+            best = (reach[i], score[i])
+            for j, similarity in zip(neighbors[indptr[i]:indptr[i + 1]].tolist(),
+                                     similarities[indptr[i]:indptr[i + 1]].tolist()):
+                candidate = (reach[j], score[j] * similarity)
+                if following[i] < 0 or candidate > best:
+                    best, following[i], link_similarity[i] = candidate, j, similarity
+            reach[i], score[i] = best
+        return following, link_similarity
+
+    def _branches(self, indptr, neighbors, similarities, min_similarity, branch_ratio):
+        events = []
+        for i in range(len(self)):
+            by_year = defaultdict(list)
+            for j, similarity in zip(neighbors[indptr[i]:indptr[i + 1]].tolist(),
+                                     similarities[indptr[i]:indptr[i + 1]].tolist()):
+                by_year[int(self.node_years[j])].append((int(self.node_clusters[j]), similarity))
+            for other_year, branches in sorted(by_year.items()):
+                # Branches come strongest first
+                strong = [(cid, sim) for cid, sim in branches
+                          if sim >= min_similarity and sim >= branch_ratio * branches[0][1]]
+                if len(strong) > 1:
+                    events.append({"year": int(self.node_years[i]), "cluster": int(self.node_clusters[i]),
+                                   "other_year": other_year, "branches": strong})
+        return events
+
+    def node(self, year, cluster):
+        """Node index of a topic; KeyError if the analysis has no such topic."""
+        return self._node[(int(year), int(cluster))]
+
+    def topics(self, year=None):
+        """(year, cluster_id) of every topic, or of one year's topics."""
+        start, stop = (0, len(self)) if year is None else self.year_slices.get(int(year), (0, 0))
+        return list(zip(self.node_years[start:stop].tolist(), self.node_clusters[start:stop].tolist()))
+
+    def neighbors(self, year, cluster, direction="forward"):
+        """[(year, cluster_id, similarity)] linked to a topic, strongest first."""
+        indptr, neighbors, similarities = self._adjacency(direction == "forward")
+        i = self.node(year, cluster)
+        ids = neighbors[indptr[i]:indptr[i + 1]]
+        return list(zip(self.node_years[ids].tolist(), self.node_clusters[ids].tolist(),
+                        similarities[indptr[i]:indptr[i + 1]].tolist()))
+
+    def lineage(self, year, cluster, direction="forward"):
+        """
+        The topic's precomputed strongest path, starting with the topic itself:
+        [{"year", "cluster", "similarity" (of the link into it), "cumulative"}].
+        """
+        following, link_similarity = self._forward if direction == "forward" else self._backward
+        i = self.node(year, cluster)
+        path = [{"year": int(self.node_years[i]), "cluster": int(self.node_clusters[i]),
+                 "similarity": None, "cumulative": 1.0}]
+        while following[i] >= 0:
+            cumulative = path[-1]["cumulative"] * link_similarity[i]
+            similarity, i = float(link_similarity[i]), following[i]
+            path.append({"year": int(self.node_years[i]), "cluster": int(self.node_clusters[i]),
+                         "similarity": similarity, "cumulative": float(cumulative)})
+        return path
+
+    def reachable(self, year, cluster, direction="forward", in_year=None):
+        """
+        [(year, cluster_id, cumulative similarity)] of every topic the topic
+        leads to (or, backward, comes from) through the links, with the best
+        cumulative similarity over all paths, by year then strongest first.
+        `in_year` keeps one year only, e.g. "where did this 2019 topic go by 2024".
+        """
+        forward = direction == "forward"
+        indptr, neighbors, similarities = self._adjacency(forward)
+        start = self.node(year, cluster)
+        best = np.zeros(len(self))
+        best[start] = 1.0
+        for i in (range(start, len(self)) if forward else range(start, -1, -1)):
+            if best[i] > 0 and indptr[i + 1] > indptr[i]:
+                np.maximum.at(best, neighbors[indptr[i]:indptr[i + 1]], best[i] * similarities[indptr[i]:indptr[i + 1]])
+        best[start] = 0.0
+        found = np.flatnonzero(best > 0)
+        if in_year is not None:
+            found = found[self.node_years[found] == int(in_year)]
+        found = found[np.lexsort((-best[found], self.node_years[found] * (1 if forward else -1)))]
+        return list(zip(self.node_years[found].tolist(), self.node_clusters[found].tolist(), best[found].tolist()))
+
+    def find(self, words):
+        """(year, cluster_id) of the topics whose keywords contain every word (a string or a list), by year."""
+        words = words.split() if isinstance(words, str) else words
+        words = [word.lower() for word in words]
+        if not words:
+            return []
+        ids = None
+        for word in words:
+            matches = self._keyword_nodes.get(word)
+            if matches is None:
+                return []
+            ids = matches if ids is None else np.intersect1d(ids, matches, assume_unique=True)
+        return list(zip(self.node_years[ids].tolist(), self.node_clusters[ids].tolist()))
@@ -0,0 +1,118 @@
+"""
+Signed feature hashing: an alternative to the vocabulary + IDF passes.
+
+Every word is hashed (CRC32, stable across processes) into one of
+`n_features` buckets with a +1/-1 sign, so documents can be vectorized as
+soon as they are cleaned, without a global vocabulary and without keeping
+the abstracts around. Document frequencies are counted per bucket on the
+fly, and a bounded reverse map remembers the most frequent words of each
+bucket so clusters still get readable keywords.
+"""
+import zlib
+from collections import Counter, defaultdict
+import numpy as np
+import scipy.sparse as sp
+
+from tfidf_manual import idf_from_doc_freq, tokens_of
+
+HASH_FEATURES = 2 ** 14
+# Words remembered per bucket by the reverse map
+TERMS_PER_BUCKET = 3
+
+def hash_term(term, n_features=HASH_FEATURES):
+    """(bucket, sign) of a word: low bits of its CRC32 pick the bucket, the top bit the sign."""
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % n_features, -1 if h & 0x80000000 else 1
+
+class FeatureHasher:
+    """
+    Streaming signed hashing vectorizer. `transform` turns one batch of
+    cleaned documents (e.g. a year) into signed bucket counts while
+    updating the document frequencies and the reverse map. The reverse map
+    is pruned to `terms_per_bucket` words per bucket whenever it holds more
+    than `max_terms` words, so its memory stays bounded.
+    """
+
+    def __init__(self, n_features=HASH_FEATURES, terms_per_bucket=TERMS_PER_BUCKET, max_terms=None):
+        self.n_features = n_features
+        self.terms_per_bucket = terms_per_bucket
+        self.max_terms = 8 * n_features if max_terms is None else max_terms
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.term_counts = Counter()
+        # (bucket, sign) of recently seen words, cleared with every prune
+        self._hashes = {}
+
+    def transform(self, docs):
+        """
+        Hashes documents (strings or token lists) into a CSR doc x bucket matrix of signed counts.
+        Returns (counts, doc_lengths) like `tfidf_manual.build_term_counts`.
+        """
+        indptr = [0]
+        indices, data, doc_lengths, touched = [], [], [], []
+        for doc in docs:
+            words = tokens_of(doc)
+            doc_lengths.append(len(words))
+            row = defaultdict(int)
+            for word, count in Counter(words).items():
+                hashed = self._hashes.get(word)
+                if hashed is None:
+                    hashed = self._hashes[word] = hash_term(word, self.n_features)
+                row[hashed[0]] += hashed[1] * count
+            buckets = sorted(row)
+            # A bucket counts towards the document frequency even if its signs cancel out
+            touched.extend(buckets)
+            for bucket in buckets:
+                if row[bucket]:
+                    indices.append(bucket)
+                    data.append(row[bucket])
+            indptr.append(len(indices))
+            self.term_counts.update(words)
+            if len(self.term_counts) > self.max_terms:
+                self._prune()
+        self.doc_freq += np.bincount(np.array(touched, dtype=np.int64), minlength=self.n_features)
+        self.n_docs += len(doc_lengths)
+        counts = sp.csr_matrix(
+            (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(doc_lengths), self.n_features)
+        )
+        return counts, np.array(doc_lengths, dtype=np.int64)
+
+    def _prune(self):
+        """Keeps only the most frequent words of every bucket in the reverse map."""
+        kept = {}
+        for bucket, terms in self.bucket_top_terms().items():
+            for term in terms:
+                kept[term] = self.term_counts[term]
+        self.term_counts = Counter(kept)
+        self._hashes = {}
+
+    def bucket_top_terms(self):
+        """{bucket: [most frequent words, best first]} for every non-empty bucket."""
+        by_bucket = defaultdict(list)
+        for term, count in self.term_counts.items():
+            by_bucket[hash_term(term, self.n_features)[0]].append((-count, term))
+        return {bucket: [term for _, term in sorted(terms)[:self.terms_per_bucket]]
+                for bucket, terms in by_bucket.items()}
+
+    def bucket_terms(self):
+        """
+        A word per bucket (its most frequent one, "" if the bucket is empty):
+        stands in for the vocabulary, so keyword ids read as words.
+        """
+        labels = [""] * self.n_features
+        for bucket, terms in self.bucket_top_terms().items():
+            labels[bucket] = terms[0]
+        return labels
+
+    def weights(self):
+        """
+        Per-bucket IDF times the sign of the bucket's top word, used in place
+        of the IDF vector. Flipping whole columns leaves cosine similarities
+        unchanged but makes each bucket's main word weigh positively, so
+        centroid keywords rank the way they would without hashing.
+        """
+        signs = np.ones(self.n_features)
+        for bucket, terms in self.bucket_top_terms().items():
+            signs[bucket] = hash_term(terms[0], self.n_features)[1]
+        return idf_from_doc_freq(self.doc_freq, self.n_docs) * signs
@@ -1,79 +1,242 @@
-from data_fetch import fetch_arxiv_year
-from preprocess import preprocess_text
-from tfidf_manual import build_vocabulary, compute_tf, compute_idf
-from clustering import dbscan_cosine
-from cluster_semantics import extract_cluster_semantics, extract_cluster_keywords
-from save_results import save_cluster_semantics, save_cluster_keywords
-from semantic_linking import link_clusters_semantic
+import argparse
+import hashlib
+import itertools
 import json
-import numpy as np
-
-def run_pipeline(category, start_year, end_year, max_results=500):
-    EPS = 0.8          # DBSCAN distance threshold (increased for better clustering)
-    MIN_PTS = 10        # Min points for a robust cluster (increased)
-    TOP_N = 10         # Keywords per cluster
-    MAX_FEATURES = 3000 # Max features for the vocabulary
-
-    year_docs = {}  # {year: [cleaned abstracts]}
-    all_docs = []   # for global vocabulary
-
-    # Pass 1: Fetch & preprocess
-    for year in range(start_year, end_year + 1):
-        print(f"\n📅 Fetching and cleaning year: {year}")
-        df = fetch_arxiv_year(category, year, max_results=max_results)
-        if df.empty:
-            print(f"⚠ No data for {year}")
-            year_docs[year] = []
-            continue
-        df["cleaned"] = df["abstract"].apply(preprocess_text)
-        docs = df["cleaned"].tolist()
-        year_docs[year] = docs
-        all_docs.extend(docs)
-
-    # Build global vocabulary & IDF
-    print(f"\n📖 Building global vocabulary with top {MAX_FEATURES} features...")
-    global_vocab = build_vocabulary(all_docs, max_features=MAX_FEATURES)
-    global_idf = compute_idf(all_docs, global_vocab)
-
-    # Pass 2: Process each year with fixed vocab
-    for year in range(start_year, end_year + 1):
-        print(f"\n⚙ Processing year: {year}")
-        docs = year_docs[year]
-        if not docs:
-            print(f"⚠ Skipping {year}, no documents.")
-            continue
-
-        # Compute TF-IDF with fixed vocab
-        tfidf_matrix = np.array([compute_tf(doc, global_vocab) * global_idf for doc in docs])
-
-        # Cluster
-        labels = dbscan_cosine(tfidf_matrix, eps=EPS, min_pts=MIN_PTS)
-        num_clusters = len(set(labels) - {-1})
-        print(f"Found {num_clusters} clusters for {year}")
-
-
-        # Semantic vectors & keywords
-        semantics = extract_cluster_semantics(tfidf_matrix, labels)
-        keywords = extract_cluster_keywords(tfidf_matrix, global_vocab, labels, top_n=TOP_N)
-
-        # Save
-        save_cluster_semantics(year, semantics)
-        save_cluster_keywords(year, keywords)
-        if num_clusters > 0:
-            print(f"✅ Saved {len(semantics)} clusters for {year}")
-
-    # Linking
-    print("\n🔗 Linking clusters semantically...")
-    links = link_clusters_semantic(threshold=0.1) # Threshold can be adjusted
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pipeline import run_analysis, iter_analysis
+from profiling import StageProfiler
+from categories import CS_CATEGORIES
+from clustering import LSH_RECALL
+from snapshots import export_snapshot
+from data_fetch import SharedRateLimiter, set_default_limiter
+
+EPS = 0.8          # DBSCAN distance threshold (increased for better clustering)
+MIN_PTS = 10        # Min points for a robust cluster (increased)
+TOP_N = 10         # Keywords per cluster
+MAX_FEATURES = 3000 # Max features for the vocabulary
+
+BATCH_DIR = os.path.join("results", "batch")
+# Parameter-set keys a batch job spec may use, passed on to run_analysis
+JOB_PARAMS = ("eps", "min_pts", "top_n", "max_features", "max_results", "link_threshold", "link_top_k", "link_span",
+              "dbscan_options", "graph_max_eps", "idf_tolerance", "hashing_options", "out_of_core_options",
+              "dedup_threshold")
+
+def run_pipeline(category, start_year, end_year, max_results=500, workers=None, profile_stage=None, trace_memory=False,
+                 approximate=False, hashing=False, memory_budget_mb=None):
+    profiler = StageProfiler(trace_memory=trace_memory, profile_stage=profile_stage)
+    result = run_analysis(category, start_year, end_year, EPS, MIN_PTS, top_n=TOP_N, max_features=MAX_FEATURES,
+                          max_results=max_results, link_threshold=0.1, report=print, workers=workers,
+                          profiler=profiler, dbscan_options={"approximate": True, "recall": LSH_RECALL} if approximate else None,
+                          hashing_options={} if hashing else None,
+                          out_of_core_options=None if memory_budget_mb is None else {"memory_budget_mb": memory_budget_mb})
+    links = result["links"]
     print(f"✅ Found {len(links)} links between years")
-
-    with open("results/topic_links_semantic.json", "w") as f:
-        json.dump(links, f, indent=4)
-
+    print(f"📁 Results saved in {result['results_dir']}")
+    print(f"\n⏱ Stage timings (trace: {result['trace_path']})")
+    print(profiler.format_table())
+    for path in profiler.profile_paths:
+        print(f"🔍 cProfile stats: {path}")
     return links
 
-if __name__ == "__main__":
+# --- Headless batch runs ---
+
+def expand_jobs(spec):
+    """
+    Turns a job spec into the list of jobs it describes: every category x
+    year range x parameter set. A spec is a dict like
+        {"categories": ["cs.AI", "cs.LG"] or "all",
+         "year_ranges": [[2019, 2023], [2015, 2024]],
+         "param_sets": [{}, {"eps": 0.7, "min_pts": 5}],
+         "max_results": 500}
+    where parameter sets override the run_pipeline defaults with any of JOB_PARAMS.
+    """
+    categories = spec.get("categories", "all")
+    if categories == "all":
+        categories = list(CS_CATEGORIES.values())
+    defaults = {"eps": EPS, "min_pts": MIN_PTS, "top_n": TOP_N, "max_features": MAX_FEATURES,
+                "max_results": spec.get("max_results", 500), "link_threshold": 0.1}
+    jobs = []
+    for category, (start_year, end_year), param_set in itertools.product(
+            categories, spec["year_ranges"], spec.get("param_sets") or [{}]):
+        unknown = set(param_set) - set(JOB_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown job parameters: {sorted(unknown)}")
+        job = {"category": category, "start_year": int(start_year), "end_year": int(end_year),
+               "params": {**defaults, **param_set}}
+        job["id"] = hashlib.sha256(json.dumps(job, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        jobs.append(job)
+    return jobs
+
+def _write_checkpoint(checkpoint_dir, state):
+    # Written to a temporary file and renamed, so a crash never leaves half a checkpoint
+    path = os.path.join(checkpoint_dir, f"{state['job']['id']}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=4, default=str)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(checkpoint_dir, job_id):
+    try:
+        with open(os.path.join(checkpoint_dir, f"{job_id}.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def run_job(job, checkpoint_dir, workers=1):
+    """
+    Runs one job through `iter_analysis`, checkpointing its state after every
+    stage and every clustered year. The expensive intermediate results live
+    in the shared stores (fetched windows in the corpus cache, per-year term
+    counts and labels in the term store, finished analyses in the results
+    store), so rerunning a crashed job picks up where it stopped.
+    Returns the job's final state.
+    """
+    profiler = StageProfiler()
+    state = {"job": job, "status": "running", "started_at": time.time(), "stage": None, "years_done": [],
+             "stages_done": []}
+
+    def report(message):
+        # Called when a stage starts: everything recorded so far is finished
+        state["stage"] = message
+        state["stages_done"] = sorted({record["stage"] for record in profiler.records})
+        _write_checkpoint(checkpoint_dir, state)
+
+    started = time.perf_counter()
+    try:
+        params = dict(job["params"])
+        eps, min_pts = params.pop("eps"), params.pop("min_pts")
+        for event in iter_analysis(job["category"], job["start_year"], job["end_year"], eps, min_pts,
+                                   report=report, workers=workers, profiler=profiler, **params):
+            if event["event"] == "year":
+                state["years_done"].append(event["year"])
+                report(f"Clustered {event['year']}")
+            elif event["event"] == "done":
+                result = event["result"]
+                state.update(status="done", results_dir=result["results_dir"], cached=result["cached"],
+                             n_links=len(result["links"]), trace_path=result["trace_path"])
+    except Exception as e:
+        state.update(status="failed", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    timings = {}
+    for record in profiler.records:
+        timings[record["stage"]] = round(timings.get(record["stage"], 0.0) + record["wall_s"], 4)
+    state.update(wall_s=round(time.perf_counter() - started, 4), timings=timings,
+                 stages_done=sorted(timings), finished_at=time.time())
+    _write_checkpoint(checkpoint_dir, state)
+    return state
+
+def _run_job_group(jobs, checkpoint_dir, workers):
+    return [run_job(job, checkpoint_dir, workers) for job in jobs]
+
+def run_batch(spec, workers=1, checkpoint_dir=None, resume=True, report=print, export_snapshots=False):
+    """
+    Runs every job of a spec (see `expand_jobs`). Jobs of the same category
+    run one after the other in one worker, so overlapping year ranges and
+    parameter sets reuse its fetched corpus and tokens as soon as they are
+    stored; different categories run in parallel on `workers` processes.
+    With `resume`, jobs whose checkpoint says "done" are skipped.
+    With `export_snapshots`, the first parameter set's result of every
+    category and year range is exported as the app's snapshot for that view.
+    Writes summary.json to the checkpoint directory and returns the summary.
+    """
+    jobs = expand_jobs(spec)
+    if checkpoint_dir is None:
+        spec_key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        checkpoint_dir = os.path.join(BATCH_DIR, spec_key)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    states, pending = {}, []
+    for job in jobs:
+        checkpoint = load_checkpoint(checkpoint_dir, job["id"]) if resume else None
+        if checkpoint is not None and checkpoint["status"] == "done":
+            states[job["id"]] = dict(checkpoint, resumed=True)
+        else:
+            pending.append(job)
+    report(f"📋 {len(jobs)} jobs, {len(jobs) - len(pending)} already done, checkpoints in {checkpoint_dir}")
+
+    groups = {}
+    for job in pending:
+        groups.setdefault(job["category"], []).append(job)
+    # Longest ranges first: their corpus and tokens then cover the shorter ones
+    groups = [sorted(group, key=lambda job: job["start_year"] - job["end_year"]) for group in groups.values()]
+    workers = max(1, min(workers, len(groups)))
+    if workers == 1:
+        for group in groups:
+            for job in group:
+                report(f"⚙️ {job['category']} {job['start_year']}-{job['end_year']} ({job['id']})...")
+                states[job["id"]] = run_job(job, checkpoint_dir)
+    else:
+        # One year at a time inside each job: the batch workers already use the cores.
+        # Every worker fetches through one limiter, so arXiv still sees one request per interval
+        context = multiprocessing.get_context("spawn")
+        limiter = SharedRateLimiter(context=context)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=set_default_limiter,
+                                 initargs=(limiter,)) as pool:
+            futures = [pool.submit(_run_job_group, group, checkpoint_dir, 1) for group in groups]
+            for future in as_completed(futures):
+                for state in future.result():
+                    states[state["job"]["id"]] = state
+                    report(f"{'✅' if state['status'] == 'done' else '❌'} {state['job']['category']} "
+                           f"{state['job']['start_year']}-{state['job']['end_year']} ({state['job']['id']})")
+
+    summary = {"checkpoint_dir": checkpoint_dir, "jobs": []}
+    views = set()
+    for job in jobs:
+        state = states[job["id"]]
+        view = (job["category"], job["start_year"], job["end_year"])
+        snapshot = None
+        if export_snapshots and view not in views and state["status"] == "done":
+            try:
+                snapshot = export_snapshot(state["results_dir"])
+            except OSError as e:
+                # A resumed job's results may have been evicted from the store since
+                report(f"⚠️ No snapshot for {job['category']} {job['start_year']}-{job['end_year']}: {e}")
+        views.add(view)
+        summary["jobs"].append({
+            "id": job["id"], "category": job["category"], "start_year": job["start_year"],
+            "end_year": job["end_year"], "params": job["params"], "status": state["status"],
+            "resumed": state.get("resumed", False), "cached": state.get("cached"), "wall_s": state.get("wall_s"),
+            "timings": state.get("timings", {}), "n_links": state.get("n_links"),
+            "results_dir": state.get("results_dir"), "snapshot": snapshot, "error": state.get("error"),
+        })
+    with open(os.path.join(checkpoint_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=4, default=str)
+    return summary
+
+def format_summary(summary):
+    """Plain-text table of a batch summary: one line per job."""
+    lines = [f"{'job':<14}{'category':<10}{'years':<11}{'status':<9}{'wall (s)':>10}{'links':>8}  note"]
+    for job in summary["jobs"]:
+        note = "resumed" if job["resumed"] else ("cached" if job["cached"] else (job["error"] or ""))
+        wall = "" if job["wall_s"] is None else job["wall_s"]
+        links = "" if job["n_links"] is None else job["n_links"]
+        lines.append(f"{job['id']:<14}{job['category']:<10}{job['start_year']}-{job['end_year']:<6}"
+                     f"{job['status']:<9}{wall:>10}{links:>8}  {note}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scientific Field Evolution Tracker")
+    parser.add_argument("--batch", metavar="SPEC", help="run the jobs of a JSON job spec without prompting")
+    parser.add_argument("--workers", type=int, default=1, help="parallel batch workers (one category each)")
+    parser.add_argument("--checkpoint-dir", help=f"job checkpoints and summary (default: {BATCH_DIR}/<spec hash>)")
+    parser.add_argument("--no-resume", action="store_true", help="rerun jobs even if their checkpoint says done")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="export app snapshots (first parameter set of every category and year range)")
+    args = parser.parse_args(argv)
+
     print("📊 Scientific Field Evolution Tracker (Semantic Version)\n")
+    if args.batch:
+        with open(args.batch, "r") as f:
+            spec = json.load(f)
+        summary = run_batch(spec, workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                            resume=not args.no_resume, export_snapshots=args.snapshots)
+        print(format_summary(summary))
+        print(f"\n📁 Summary written to {os.path.join(summary['checkpoint_dir'], 'summary.json')}")
+        return
 
     category = input("Enter ArXiv category code (e.g., cs.AI): ").strip()
     start_year = int(input("Enter start year (e.g., 2020): "))
@@ -83,4 +246,7 @@ if __name__ == "__main__":
 
     print("\nSample semantic links across years:")
     for link in links[:10]:
-        print(link)
\ No newline at end of file
+        print(link)
+
+if __name__ == "__main__":
+    main()
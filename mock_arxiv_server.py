@@ -0,0 +1,153 @@
+"""
+Local stand-in for the ArXiv Atom API, for testing the fetchers offline.
+
+Run it with `python mock_arxiv_server.py --port 8000` and point the fetchers at
+`http://127.0.0.1:8000/api/query?` through their `base_url` argument, or start
+it in-process with `start_mock_server()`.
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+TOPIC_WORDS = [
+    ["neural", "network", "training", "gradient", "layer", "deep", "optimization", "loss"],
+    ["graph", "node", "edge", "vertex", "embedding", "spectral", "community", "random"],
+    ["robot", "control", "motion", "planning", "sensor", "manipulation", "trajectory", "navigation"],
+    ["language", "text", "translation", "token", "semantic", "parsing", "dialogue", "corpus"],
+    ["image", "vision", "segmentation", "detection", "pixel", "camera", "object", "scene"],
+    ["privacy", "attack", "encryption", "security", "protocol", "adversary", "key", "threat"],
+]
+FILLER_WORDS = ["the", "we", "a", "of", "and", "novel", "results", "show", "this", "paper", "in", "for"]
+
+def make_abstract(category, year, index, words_per_abstract=60):
+    """Deterministic synthetic abstract drawn mostly from one topic's words."""
+    rng = random.Random(f"{category}:{year}:{index}")
+    topic = TOPIC_WORDS[index % len(TOPIC_WORDS)]
+    words = [rng.choice(topic) if rng.random() < 0.6 else rng.choice(FILLER_WORDS) for _ in range(words_per_abstract)]
+    return " ".join(words).capitalize() + "."
+
+def make_paper(category, year, index):
+    """The (id, title, abstract) triple served at position `index` of a category/year."""
+    return (
+        f"http://arxiv.org/abs/{year}.{index:05d}v1",
+        f"Synthetic {category} paper {index} of {year}",
+        make_abstract(category, year, index),
+    )
+
+def expected_papers(category, year, total_results):
+    """Every (id, title, abstract) triple the server returns for a category/year, in order."""
+    return [make_paper(category, year, i) for i in range(total_results)]
+
+def render_feed(category, year, start, max_results, total_results):
+    entries = []
+    for i in range(start, min(start + max_results, total_results)):
+        published = f"{year}-{1 + i % 12:02d}-{1 + i % 28:02d}T12:00:00Z"
+        paper_id, title, abstract = make_paper(category, year, i)
+        entries.append(
+            f"<entry><id>{escape(paper_id)}</id><published>{published}</published><updated>{published}</updated>"
+            f"<title>{escape(title)}</title><summary>{escape(abstract)}</summary></entry>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+        f"<title>ArXiv Query</title><opensearch:totalResults>{total_results}</opensearch:totalResults>"
+        f"<opensearch:startIndex>{start}</opensearch:startIndex>"
+        f"<opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>"
+        + "".join(entries) + "</feed>"
+    )
+
+class MockArxivServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering /api/query with synthetic Atom feeds.
+    - total_results: papers per (category, year), an int or a callable(category, year)
+    - latency: seconds slept before each response
+    - fail_every: answer every n-th request with HTTP 503 (0 disables)
+    - drop_every: close the connection of every n-th request without an answer (0 disables)
+    Request timestamps are kept in `request_times` for rate-limit checks.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, total_results=250, latency=0.0, fail_every=0, drop_every=0):
+        super().__init__(address, _Handler)
+        self.total_results = total_results
+        self.latency = latency
+        self.fail_every = fail_every
+        self.drop_every = drop_every
+        self.request_times = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/query?"
+
+    def results_for(self, category, year):
+        if callable(self.total_results):
+            return self.total_results(category, year)
+        return self.total_results
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.request_times.append(time.monotonic())
+            request_number = len(server.request_times)
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_every and request_number % server.fail_every == 0:
+            self.send_error(503, "Simulated overload")
+            return
+        if server.drop_every and request_number % server.drop_every == 0:
+            self.close_connection = True
+            return
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        search = unquote(params.get("search_query", [""])[0])
+        category_match = re.search(r"cat:([\w.\-]+)", search)
+        year_match = re.search(r"submittedDate:\[(\d{4})", search)
+        if url.path != "/api/query" or not category_match or not year_match:
+            self.send_error(400, "Unsupported query")
+            return
+        category, year = category_match.group(1), int(year_match.group(1))
+        start = int(params.get("start", ["0"])[0])
+        max_results = int(params.get("max_results", ["10"])[0])
+
+        body = render_feed(category, year, start, max_results, server.results_for(category, year)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock_server(host="127.0.0.1", port=0, **kwargs):
+    """Starts a MockArxivServer on a background thread and returns it; call `shutdown()` when done."""
+    server = MockArxivServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic ArXiv Atom feeds locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--total-results", type=int, default=250)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--drop-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockArxivServer((args.host, args.port), total_results=args.total_results,
+                             latency=args.latency, fail_every=args.fail_every, drop_every=args.drop_every)
+    print(f"Mock ArXiv API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
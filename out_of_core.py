@@ -0,0 +1,146 @@
+"""
+Out-of-core execution: per-run spill directories of memory-mapped CSR
+matrices, and the block/chunk/worker sizes that keep a run under a memory budget.
+
+In out-of-core mode (`out_of_core_options` in `pipeline.run_analysis`) a
+year's tokens are turned into term counts as soon as it is cleaned, its
+vocabulary counts and float32 TF-IDF are written here and memory-mapped
+back, and clustering, centroid aggregation and saving work on one year (and
+one row chunk) at a time. The TF-IDF, its normalized rows and their
+transpose are built a row chunk at a time straight into the spill files. Mapped pages are backed by the spill files, so the
+OS can drop them under memory pressure instead of the run growing with the corpus.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from tfidf_manual import tfidf_from_counts
+
+SPILL_DIR = os.path.join("cache", "spill")
+MEMORY_BUDGET_MB = 1024
+
+# Share of the budget one similarity block of the neighbor search may use
+BLOCK_SHARE = 0.1
+# Peak bytes per block byte: the block, its boolean mask and, when every
+# pair in it is a neighbor, the int64 row and column indices of those pairs
+BLOCK_PEAK_FACTOR = 3.125
+# Per-document arrays of the neighbor search and DBSCAN (counts, indptr, labels, queue)
+BYTES_PER_DOC = 64
+
+class SpilledCSR:
+    """
+    A CSR matrix saved as .npy columns in a spill directory. Pickles as its
+    paths only, so worker processes map the files themselves instead of
+    receiving a copy; `open` returns the memory-mapped matrix.
+    """
+
+    def __init__(self, prefix, shape, nnz, data_prefix=None):
+        self.prefix = prefix
+        self.shape = tuple(shape)
+        self.nnz = nnz
+        # Matrices with the same sparsity pattern share their indices and indptr files
+        self.data_prefix = data_prefix or prefix
+
+    def open(self):
+        data = np.load(f"{self.data_prefix}_data.npy", mmap_mode="r")
+        indices, indptr = (np.load(f"{self.prefix}_{column}.npy", mmap_mode="r") for column in ("indices", "indptr"))
+        return sp.csr_matrix((data, indices, indptr), shape=self.shape)
+
+def spill_csr(matrix, spill_dir, name, dtype=None):
+    """
+    Writes a sparse matrix (optionally cast to `dtype`) to `spill_dir` and
+    returns its SpilledCSR. Indices and indptr share one index dtype so scipy
+    maps them as they are instead of converting them in memory.
+    """
+    matrix = sp.csr_matrix(matrix)
+    index_dtype = np.int32 if matrix.nnz < np.iinfo(np.int32).max else np.int64
+    prefix = os.path.join(spill_dir, name)
+    np.save(f"{prefix}_data.npy", matrix.data if dtype is None else matrix.data.astype(dtype, copy=False))
+    np.save(f"{prefix}_indices.npy", matrix.indices.astype(index_dtype, copy=False))
+    np.save(f"{prefix}_indptr.npy", matrix.indptr.astype(index_dtype, copy=False))
+    return SpilledCSR(prefix, matrix.shape, matrix.nnz)
+
+def spill_tfidf(counts, doc_lengths, idf, spill_dir, name, chunk_rows=None):
+    """
+    Writes the float32 TF-IDF of a count matrix (`tfidf_from_counts`), the
+    same rows scaled to unit L2 norm, and the normalized rows' transpose in
+    CSR form, `chunk_rows` rows at a time, into .npy files created at full
+    size and filled in place, so none of them is held in memory whole.
+    Returns SpilledCSRs (tfidf, unit, unit_transposed).
+    """
+    counts = open_matrix(counts)
+    n_rows, n_features = counts.shape
+    nnz = counts.nnz
+    chunk_rows = chunk_rows or max(n_rows, 1)
+    index_dtype = np.int32 if max(nnz, n_rows, n_features) < np.iinfo(np.int32).max else np.int64
+    prefix = os.path.join(spill_dir, name)
+    create = lambda path, length, dtype: np.lib.format.open_memmap(f"{path}.npy", mode="w+", dtype=dtype,
+                                                                    shape=(length,))
+    data, unit_data = create(f"{prefix}_data", nnz, np.float32), create(f"{prefix}_unit_data", nnz, np.float32)
+    indices, indptr = create(f"{prefix}_indices", nnz, index_dtype), create(f"{prefix}_indptr", n_rows + 1, index_dtype)
+    indptr[:] = counts.indptr
+    column_nnz = np.zeros(n_features, dtype=np.int64)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        lo, hi = int(indptr[start]), int(indptr[stop])
+        chunk = tfidf_from_counts(counts[start:stop], doc_lengths[start:stop], idf, dtype=np.float32)
+        data[lo:hi], indices[lo:hi] = chunk.data, chunk.indices
+        rows = np.repeat(np.arange(stop - start), np.diff(chunk.indptr))
+        norms = np.sqrt(np.bincount(rows, weights=chunk.data.astype(np.float64) ** 2, minlength=stop - start))
+        norms[norms == 0] = 1.0
+        unit_data[lo:hi] = chunk.data / norms[rows]
+        column_nnz += np.bincount(chunk.indices, minlength=n_features)
+
+    # Transpose by counting sort: each column's slots are filled in row order, chunk by chunk
+    t_prefix = f"{prefix}_unit_t"
+    t_data, t_indices = create(f"{t_prefix}_data", nnz, np.float32), create(f"{t_prefix}_indices", nnz, index_dtype)
+    t_indptr = create(f"{t_prefix}_indptr", n_features + 1, index_dtype)
+    t_indptr[0] = 0
+    t_indptr[1:] = np.cumsum(column_nnz)
+    cursor = np.asarray(t_indptr[:-1], dtype=np.int64)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        lo, hi = int(indptr[start]), int(indptr[stop])
+        cols = np.asarray(indices[lo:hi], dtype=np.int64)
+        order = np.argsort(cols, kind="stable")
+        sorted_cols = cols[order]
+        # Slot = the column's next free position plus the entry's rank within the column in this chunk
+        slots = cursor[sorted_cols] + np.arange(len(order)) - np.searchsorted(sorted_cols, sorted_cols)
+        rows = np.repeat(np.arange(start, stop), np.diff(indptr[start:stop + 1]))
+        t_indices[slots], t_data[slots] = rows[order], unit_data[lo:hi][order]
+        cursor += np.bincount(cols, minlength=n_features)
+    for array in (data, unit_data, indices, indptr, t_data, t_indices, t_indptr):
+        array.flush()
+    return (SpilledCSR(prefix, (n_rows, n_features), nnz),
+            SpilledCSR(prefix, (n_rows, n_features), nnz, data_prefix=f"{prefix}_unit"),
+            SpilledCSR(t_prefix, (n_features, n_rows), nnz))
+
+def open_matrix(matrix):
+    """The matrix itself, or its memory-mapped form if it was spilled."""
+    return matrix.open() if isinstance(matrix, SpilledCSR) else matrix
+
+def new_spill_dir(spill_root=SPILL_DIR):
+    """A fresh spill directory for one run; remove it with `discard_spill_dir`."""
+    os.makedirs(spill_root, exist_ok=True)
+    return tempfile.mkdtemp(prefix="run-", dir=spill_root)
+
+def discard_spill_dir(spill_dir):
+    if spill_dir is not None:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def memory_plan(memory_budget_mb, n_features, workers, largest_docs=0):
+    """
+    Sizes that keep one run under `memory_budget_mb`: a dict with
+    block_memory_bytes (similarity block), chunk_rows (TF-IDF and
+    aggregation chunk), workers (years clustered at once) and worker_bytes
+    (one year's peak). A year's matrices and neighbor lists are all spilled,
+    so only its per-document arrays grow with its size.
+    """
+    budget = int(memory_budget_mb * 1024 * 1024)
+    block_memory_bytes = max(1024 * 1024, int(budget * BLOCK_SHARE))
+    chunk_rows = max(1, block_memory_bytes // (8 * max(n_features, 1)))
+    per_worker = int(BLOCK_PEAK_FACTOR * block_memory_bytes + BYTES_PER_DOC * largest_docs)
+    workers = max(1, min(workers, budget // max(per_worker, 1)))
+    return {"block_memory_bytes": block_memory_bytes, "chunk_rows": int(chunk_rows), "workers": int(workers),
+            "worker_bytes": per_worker}
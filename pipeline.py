@@ -0,0 +1,373 @@
+"""
+Fetch -> clean -> TF-IDF -> cluster -> link pipeline of one analysis.
+
+Optional modes of `run_analysis`, each described in its own module:
+- `dedup_threshold`: duplicate papers are dropped before preprocessing (dedup.py)
+- `idf_tolerance`: per-year term counts and labels are reused from the term store (term_store.py)
+- `hashing_options`: signed feature hashing instead of a vocabulary (feature_hashing.py)
+- `out_of_core_options`: spilled, memory-mapped years under a memory budget (out_of_core.py)
+- `dbscan_options`: e.g. LSH neighborhoods (clustering.py)
+- `graph_max_eps`: neighbor graphs stored for re-clustering (reclustering.py)
+"""
+import time
+import numpy as np
+from concurrent_fetch import fetch_years_concurrent
+from preprocess import preprocess_batch
+from tfidf_manual import year_term_counts, vocabulary_from_term_counts, restrict_counts, idf_from_doc_freq
+from year_processing import iter_process_years, default_workers
+from save_results import save_vocabulary, save_year_clusters, save_link_edges, save_links, load_links
+from semantic_linking import LINK_DTYPE, centroid_matrix, link_year_pair, edges_to_links
+from results_store import ResultsStore, analysis_key, corpus_version
+from profiling import StageProfiler, peak_rss_mb
+from reclustering import write_graph_meta, write_year_graph
+from feature_hashing import FeatureHasher
+from term_store import IDF_TOLERANCE, get_default_term_store, labels_key, year_affected
+from dedup import DEDUP_THRESHOLD, Deduplicator
+from out_of_core import MEMORY_BUDGET_MB, SPILL_DIR, memory_plan, new_spill_dir, discard_spill_dir, spill_csr, \
+    open_matrix
+
+def _int_keyed(cluster_sizes):
+    """Restores {year: {cluster_id: size}} integer keys after a JSON round trip."""
+    return {int(year): {int(cid): size for cid, size in sizes.items()} for year, sizes in cluster_sizes.items()}
+
+def fetch_years(category, years, max_results, report=print, profiler=None):
+    """
+    Fetches every year concurrently (through the corpus cache).
+    Returns {year: DataFrame of its papers}.
+    """
+    profiler = profiler or StageProfiler()
+    year_dfs = {}
+    report(f"📅 Fetching {len(years)} years of {category}...")
+    # Years arrive as soon as all their pages are in, in any order
+    fetched = fetch_years_concurrent(category, years, max_results=max_results)
+    while True:
+        # Fetch time is the time spent waiting for the next finished year
+        token = profiler.start("fetch")
+        try:
+            year, df = next(fetched)
+        except StopIteration:
+            profiler.cancel(token)
+            break
+        profiler.stop(token, items=len(df), year=year)
+        year_dfs[year] = df
+    return year_dfs
+
+def clean_years(category, year_dfs, report=print, profiler=None, term_store=None, hasher=None,
+                workers=1, spill_dir=None, deduplicator=None):
+    """
+    Cleans the fetched years in year order, after a `deduplicator` drops
+    duplicates. Years already in `term_store` get None; with a `hasher`
+    they get (counts, doc_lengths). Each year's papers are released once
+    it is cleaned.
+    Returns ({year: token lists, None or (counts, doc_lengths)}, {year: [paper ids]}).
+    """
+    profiler = profiler or StageProfiler()
+    year_docs, year_ids = {}, {}
+    for year in sorted(year_dfs):
+        df = year_dfs.pop(year)
+        if deduplicator is not None:
+            with profiler.stage("dedup", items=len(df), year=year):
+                df, dropped = deduplicator.filter_year(category, year, df)
+            if dropped:
+                report(f"🧹 Dropped {dropped} duplicate papers from {year}...")
+        report(f"📅 Cleaning year: {year}...")
+        if df.empty:
+            year_docs[year], year_ids[year] = [], []
+            if hasher is not None:
+                year_docs[year] = hasher.transform([])
+            continue
+        year_ids[year] = df["id"].tolist()
+        if term_store is not None and term_store.has_terms(category, year,
+                                                           corpus_version({year: year_ids[year]})):
+            year_docs[year] = None
+            continue
+        with profiler.stage("preprocess", items=len(df), year=year):
+            year_docs[year] = preprocess_batch(df["abstract"], workers=workers)
+        if hasher is not None:
+            with profiler.stage("hashing", items=len(df), year=year):
+                year_docs[year] = hasher.transform(year_docs[year])
+                if spill_dir is not None:
+                    counts, doc_lengths = year_docs[year]
+                    year_docs[year] = (spill_csr(counts, spill_dir, f"counts_{year}"), doc_lengths)
+        elif spill_dir is not None:
+            with profiler.stage("term_counts", items=len(df), year=year):
+                term_store.put_terms(category, year, corpus_version({year: year_ids[year]}),
+                                     *year_term_counts(year_docs[year]))
+            year_docs[year] = None
+    return year_docs, year_ids
+
+def ready_link_pairs(done, years, span=1, emitted=()):
+    """
+    Year pairs that can be linked now, in the order `link_cluster_edges` uses.
+    `done` maps each finished year to whether it has clusters. A pair is
+    ready once both years and every year between them are finished, since
+    `span` counts only years that have clusters.
+    """
+    pairs = []
+    for i, y1 in enumerate(years):
+        if not done.get(y1):
+            continue
+        linked = 0
+        for y2 in years[i + 1:]:
+            if y2 not in done:
+                break
+            if done[y2]:
+                if (y1, y2) not in emitted:
+                    pairs.append((y1, y2))
+                linked += 1
+                if linked >= span:
+                    break
+    return pairs
+
+def iter_analysis(category, start_year, end_year, eps, min_pts, top_n=10, max_features=3000, max_results=500,
+                  link_threshold=0.1, link_top_k=None, link_span=1, report=print, workers=None, store=None,
+                  profiler=None, dbscan_options=None, graph_max_eps=None, term_store=None,
+                  idf_tolerance=IDF_TOLERANCE, hashing_options=None, out_of_core_options=None,
+                  dedup_threshold=DEDUP_THRESHOLD):
+    """
+    Streaming form of `run_analysis` (same arguments). Yields, as soon as each is ready:
+    - {"event": "year", "year", "cluster_sizes", "keywords"}: one year clustered
+    - {"event": "links", "source_year", "target_year", "links"}: a pair of years linked
+    - {"event": "done", "result"}: the final `run_analysis` result (the only event of a stored analysis)
+    """
+    store = store or ResultsStore()
+    term_store = term_store or get_default_term_store()
+    profiler = profiler or StageProfiler()
+    years = list(range(start_year, end_year + 1))
+    # The hashing mode vectorizes while cleaning and needs neither the term store nor a vocabulary
+    hasher = FeatureHasher(**hashing_options) if hashing_options is not None else None
+    if out_of_core_options is not None and graph_max_eps is not None:
+        # A neighbor graph grows quadratically with a year's size, past any memory budget
+        report("⚠️ Re-clustering graphs are not kept out of core...")
+        graph_max_eps = None
+    year_dfs = fetch_years(category, years, max_results, report, profiler)
+
+    params = {"eps": eps, "min_pts": min_pts, "top_n": top_n, "max_features": max_features,
+              "max_results": max_results, "link_threshold": link_threshold,
+              "link_top_k": link_top_k, "link_span": link_span, "dbscan_options": dbscan_options or {},
+              "graph_max_eps": graph_max_eps, "idf_tolerance": idf_tolerance,
+              "hashing_options": hashing_options, "out_of_core": out_of_core_options is not None,
+              "dedup_threshold": dedup_threshold}
+    trace_metadata = {"category": category, "start_year": start_year, "end_year": end_year, "params": params}
+    # Deduplication is deterministic given the fetched papers and dedup_threshold, so the key is
+    # known before any paper is deduplicated or cleaned
+    key = analysis_key(category, start_year, end_year, params,
+                       corpus_version({year: [] if df.empty else df["id"].tolist() for year, df in year_dfs.items()}))
+    manifest = store.lookup(key)
+    if manifest is not None:
+        report("♻️ Reusing stored results for this analysis...")
+        results_dir = store.path_for(key)
+        with profiler.stage("load_stored", items=None):
+            links = load_links(results_dir)
+        yield {"event": "done", "result": {
+            "links": links, "cluster_sizes": _int_keyed(manifest["cluster_sizes"]),
+            "results_dir": results_dir, "key": key, "cached": True,
+            "trace_path": profiler.write_trace(key=key, cached=True, **trace_metadata)}}
+        return
+
+    # Out of core, spilled counts and TF-IDF live in a directory of their own, removed with the run
+    spill_dir = None
+    if out_of_core_options is not None:
+        spill_dir = new_spill_dir(out_of_core_options.get("spill_dir", SPILL_DIR))
+    try:
+        year_docs, year_ids = clean_years(category, year_dfs, report, profiler,
+                                          term_store=None if hasher else term_store, hasher=hasher,
+                                          workers=default_workers() if workers is None else workers,
+                                          spill_dir=spill_dir,
+                                          deduplicator=None if dedup_threshold is None
+                                          else Deduplicator(dedup_threshold))
+    except BaseException:
+        discard_spill_dir(spill_dir)
+        raise
+
+    staging_dir = store.new_staging_dir(key)
+    try:
+        versions = {year: corpus_version({year: year_ids[year]}) for year in years}
+        n_docs = sum(len(ids) for ids in year_ids.values())
+        year_terms, year_words = {}, {}
+        if hasher is not None:
+            # Years were hashed as they were cleaned: buckets stand in for the vocabulary
+            global_vocab, global_idf = hasher.bucket_terms(), hasher.weights()
+            year_counts = {year: year_docs[year] for year in years if len(year_docs[year][1])}
+        else:
+            # Term counts of every year, tokenized once and kept in the term store
+            fresh_docs = sum(len(docs) for docs in year_docs.values() if docs is not None)
+            with profiler.stage("term_counts", items=fresh_docs):
+                for year in years:
+                    if year_docs[year] is None:
+                        # Out of core, stored years are read back one at a time below instead
+                        if spill_dir is None:
+                            year_terms[year] = term_store.get_terms(category, year, versions[year])
+                    else:
+                        year_terms[year] = year_term_counts(year_docs[year])
+                        term_store.put_terms(category, year, versions[year], *year_terms[year])
+            def terms_of(year):
+                if year in year_terms:
+                    return year_terms[year]
+                return term_store.get_terms(category, year, versions[year])
+
+            report(f"📖 Building global vocabulary with top {max_features} features...")
+            with profiler.stage("vocabulary", items=n_docs):
+                global_vocab = vocabulary_from_term_counts((terms_of(year)[:2] for year in years),
+                                                           max_features=max_features)
+                year_counts, doc_freq = {}, np.zeros(len(global_vocab), dtype=np.int64)
+                for year in years:
+                    terms, counts, doc_lengths = terms_of(year)
+                    year_words[year] = terms
+                    counts, year_doc_freq = restrict_counts(terms, counts, global_vocab)
+                    doc_freq += year_doc_freq
+                    if len(doc_lengths):
+                        if spill_dir is not None:
+                            counts = spill_csr(counts, spill_dir, f"counts_{year}")
+                        year_counts[year] = (counts, doc_lengths)
+                global_idf = idf_from_doc_freq(doc_freq, n_docs)
+        cluster_sizes = {year: {} for year in years}
+
+        # Years whose words kept their vocabulary membership and IDF (within the tolerance) keep their labels.
+        # Out of core the TF-IDF is float32, so its labels are kept apart from the float64 ones
+        label_key = labels_key({"eps": eps, "min_pts": min_pts, "dbscan_options": dbscan_options or {},
+                                "graph_max_eps": graph_max_eps, "tfidf_dtype": "float32" if spill_dir else "float64"})
+        reuse, drifted = {}, 0
+        if idf_tolerance is not None and hasher is None:
+            for year in year_counts:
+                stored = term_store.get_labels(category, year, versions[year], label_key)
+                if stored is None:
+                    continue
+                if year_affected(year_words[year], stored["vocab"], stored["idf"], global_vocab, global_idf,
+                                 tolerance=idf_tolerance):
+                    drifted += 1
+                else:
+                    reuse[year] = {"labels": stored["labels"], "graph": stored["graph"]}
+        if reuse:
+            report(f"♻️ Reusing the clusters of {len(reuse)} unchanged years...")
+        if drifted:
+            # Any change in the total document count moves every IDF
+            report(f"🔁 The vocabulary or IDF changed with the year range, clustering {drifted} stored years again...")
+
+        run_dbscan_options, chunk_rows, year_workers = dbscan_options, None, workers
+        if spill_dir is not None:
+            budget_mb = out_of_core_options.get("memory_budget_mb", MEMORY_BUDGET_MB)
+            largest_docs = max((len(doc_lengths) for _, doc_lengths in year_counts.values()), default=0)
+            plan = memory_plan(budget_mb, len(global_vocab),
+                               default_workers() if workers is None else workers, largest_docs=largest_docs)
+            # The block size only changes how neighbors are searched, not the labels
+            run_dbscan_options = {**(dbscan_options or {}), "memory_bytes": plan["block_memory_bytes"]}
+            chunk_rows, year_workers = plan["chunk_rows"], plan["workers"]
+            report(f"💾 Out of core within {budget_mb} MB: {year_workers} worker(s), "
+                   f"{chunk_rows} rows per TF-IDF and aggregation chunk...")
+            if plan["worker_bytes"] > budget_mb * 1024 * 1024:
+                report(f"⚠️ The largest year needs about {plan['worker_bytes'] / 1024 / 1024:.0f} MB, "
+                       f"over the {budget_mb} MB budget")
+
+        report(f"⚙️ Clustering {len(year_counts)} years...")
+        # Years are independent once the vocabulary and IDF are fixed
+        results = {}
+        # Years without documents are finished from the start, without clusters
+        done = {year: False for year in years if year not in year_counts}
+        matrices, pair_edges = {}, {}
+        saved_years, graph_years = set(), []
+
+        def save_year(year):
+            result = results[year]
+            cluster_sizes[year] = result["cluster_sizes"]
+            save_year_clusters(year, result["semantics"], result["keyword_ids"], cluster_sizes[year],
+                               results_dir=staging_dir)
+            if result["graph"] is not None:
+                counts, doc_lengths = year_counts[year]
+                write_year_graph(staging_dir, year, result["graph"], open_matrix(counts), doc_lengths)
+                graph_years.append(year)
+            saved_years.add(year)
+
+        profile_options = {"trace_memory": profiler.trace_memory, "profile_stage": profiler.profile_stage,
+                           "profile_dir": profiler.profile_dir}
+        year_results = iter_process_years(year_counts, global_idf, eps, min_pts, top_n,
+                                          workers=year_workers, profile_options=profile_options,
+                                          dbscan_options=run_dbscan_options, graph_max_eps=graph_max_eps,
+                                          reuse=reuse, spill_dir=spill_dir, chunk_rows=chunk_rows)
+        wait_wall = wait_cpu = 0.0
+        while True:
+            # Only time spent waiting on the workers counts, not the consumer's
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = next(year_results, None)
+            wait_wall += time.perf_counter() - wall
+            wait_cpu += time.process_time() - cpu
+            if result is None:
+                break
+            year = result["year"]
+            results[year] = result
+            if hasher is None and year not in reuse:
+                term_store.put_labels(category, year, versions[year], label_key, result["labels"],
+                                      global_vocab, global_idf, graph=result["graph"])
+            profiler.extend(result["timings"])
+            profiler.profile_paths.extend(result["profile_paths"])
+            report(f"Found {len(result['cluster_sizes'])} clusters for {year} ({len(results)}/{len(year_counts)} years done)...")
+            yield {"event": "year", "year": year, "cluster_sizes": result["cluster_sizes"],
+                   "keywords": {str(cid): [global_vocab[i] for i in ids] for cid, ids in result["keyword_ids"].items()}}
+
+            done[year] = bool(result["semantics"])
+            if done[year]:
+                matrices[year] = centroid_matrix(result["semantics"])
+            if spill_dir is not None:
+                # Out of core, a finished year goes to disk now instead of staying in memory until the end
+                with profiler.stage("save", items=len(result["cluster_sizes"]), unit="clusters", year=year):
+                    save_year(year)
+                results[year] = {"cluster_sizes": result["cluster_sizes"]}
+            # Link every pair of years whose span is now fully clustered
+            for y1, y2 in ready_link_pairs(done, years, span=link_span, emitted=pair_edges):
+                with profiler.stage("link", items=len(matrices[y1][0]) * len(matrices[y2][0]), unit="pairs", year=y1):
+                    pair_edges[(y1, y2)] = link_year_pair(y1, *matrices[y1], y2, *matrices[y2],
+                                                          threshold=link_threshold, top_k=link_top_k)
+                yield {"event": "links", "source_year": y1, "target_year": y2,
+                       "links": edges_to_links(pair_edges[(y1, y2)])}
+        profiler.add_record("cluster_years", wait_wall, wait_cpu, peak_rss_mb(), items=n_docs)
+        if spill_dir is not None and (peak_rss_mb() or 0) > budget_mb:
+            report(f"⚠️ Peak RSS {peak_rss_mb():.0f} MB went over the {budget_mb} MB budget")
+
+        unsaved = [year for year in sorted(results) if year not in saved_years]
+        with profiler.stage("save", items=sum(len(results[year]["cluster_sizes"]) for year in unsaved),
+                            unit="clusters"):
+            save_vocabulary(global_vocab, results_dir=staging_dir)
+            for year in unsaved:
+                save_year(year)
+            if graph_years:
+                write_graph_meta(staging_dir, max(graph_max_eps, eps), graph_years, global_idf)
+            # Same order as link_cluster_edges: by source year, then target year
+            edges = np.concatenate([pair_edges[pair] for pair in sorted(pair_edges)]) if pair_edges \
+                else np.empty(0, dtype=LINK_DTYPE)
+            links = edges_to_links(edges)
+            save_link_edges(edges, results_dir=staging_dir)
+            save_links(links, results_dir=staging_dir)
+    except BaseException:
+        store.discard(staging_dir)
+        raise
+    finally:
+        discard_spill_dir(spill_dir)
+
+    manifest = {"category": category, "start_year": start_year, "end_year": end_year, "params": params,
+                "cluster_sizes": {year: {int(cid): int(size) for cid, size in sizes.items()}
+                                  for year, sizes in cluster_sizes.items()}}
+    results_dir = store.commit(key, staging_dir, manifest)
+    yield {"event": "done", "result": {
+        "links": links, "cluster_sizes": _int_keyed(manifest["cluster_sizes"]),
+        "results_dir": results_dir, "key": key, "cached": False,
+        "trace_path": profiler.write_trace(key=key, cached=False, **trace_metadata)}}
+
+def run_analysis(category, start_year, end_year, eps, min_pts, top_n=10, max_features=3000, max_results=500,
+                 link_threshold=0.1, link_top_k=None, link_span=1, report=print, workers=None, store=None,
+                 profiler=None, dbscan_options=None, graph_max_eps=None, term_store=None,
+                 idf_tolerance=IDF_TOLERANCE, hashing_options=None, out_of_core_options=None,
+                 dedup_threshold=DEDUP_THRESHOLD):
+    """
+    Full fetch -> TF-IDF -> cluster -> link pipeline for one category and year range.
+    An analysis already in `store` for the same corpus and parameters is returned from it.
+    Returns a dict with links, cluster_sizes, results_dir, key, cached and trace_path.
+    """
+    for event in iter_analysis(category, start_year, end_year, eps, min_pts, top_n=top_n, max_features=max_features,
+                               max_results=max_results, link_threshold=link_threshold, link_top_k=link_top_k,
+                               link_span=link_span, report=report, workers=workers, store=store, profiler=profiler,
+                               dbscan_options=dbscan_options, graph_max_eps=graph_max_eps,
+                               term_store=term_store, idf_tolerance=idf_tolerance,
+                               hashing_options=hashing_options, out_of_core_options=out_of_core_options,
+                               dedup_threshold=dedup_threshold):
+        if event["event"] == "done":
+            return event["result"]
@@ -1,4 +1,6 @@
 import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
 # A slightly larger set of stopwords
@@ -38,3 +40,35 @@ def preprocess_text(text):
     words = [w for w in text.split() if w not in STOPWORDS and len(w) > 2]
     cleaned = " ".join(words)
     return re.sub(r"\s+", " ", cleaned).strip()  # normalize spaces
+
+# Runs of 3+ letters in the lowercased text are exactly the words preprocess_text keeps
+# before the stopword filter: every other character becomes a space there
+TOKEN_PATTERN = re.compile(r"[a-z]{3,}")
+
+# Batches smaller than this are not worth starting worker processes for
+PARALLEL_MIN_DOCS = 20000
+
+def tokenize_text(text):
+    """Cleaned words of one text as a list: same words as preprocess_text(text).split()."""
+    if not isinstance(text, str) and pd.isna(text):
+        return []
+    return [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOPWORDS]
+
+def _tokenize_chunk(texts):
+    return [tokenize_text(text) for text in texts]
+
+def preprocess_batch(texts, workers=1, chunk_size=5000):
+    """
+    Cleans a whole Series or iterable of abstracts with one compiled pattern
+    and returns their token lists, which the vectorizers take directly
+    (no join/split round trip). Batches of at least PARALLEL_MIN_DOCS texts
+    are spread over `workers` processes.
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) < PARALLEL_MIN_DOCS:
+        return _tokenize_chunk(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    # Spawned workers, like year_processing: forking the Streamlit server is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return [tokens for chunk in pool.map(_tokenize_chunk, chunks) for tokens in chunk]
@@ -0,0 +1,148 @@
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_DIR = os.path.join("results", "traces")
+PROFILE_DIR = os.path.join("results", "profiles")
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class StageProfiler:
+    """
+    Records wall time, CPU time, peak memory, item counts and throughput for
+    each pipeline stage.
+    - trace_memory: measure each stage's own peak with tracemalloc (slower);
+      otherwise the process' peak RSS at the end of the stage is reported
+    - profile_stage: name of a stage to run under cProfile; its stats are
+      dumped to `profile_dir`
+    """
+
+    def __init__(self, trace_memory=False, profile_stage=None, profile_dir=PROFILE_DIR):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.records = []
+        self.profile_paths = []
+        self.started_at = time.time()
+
+    def start(self, stage):
+        """Starts timing `stage`; pass the returned token to `stop`."""
+        profile = None
+        if stage == self.profile_stage:
+            profile = cProfile.Profile()
+            profile.enable()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        return {"stage": stage, "wall": time.perf_counter(), "cpu": time.process_time(), "profile": profile}
+
+    def stop(self, token, items=None, unit="docs", **extra):
+        """Finishes a stage started with `start` and records it."""
+        wall = time.perf_counter() - token["wall"]
+        cpu = time.process_time() - token["cpu"]
+        if self.trace_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        else:
+            peak_mb = peak_rss_mb()
+        if token["profile"] is not None:
+            token["profile"].disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{token['stage']}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+            token["profile"].dump_stats(path)
+            self.profile_paths.append(path)
+        return self.add_record(token["stage"], wall, cpu, peak_mb, items, unit, **extra)
+
+    def cancel(self, token):
+        """Abandons a stage started with `start` without recording it."""
+        if token["profile"] is not None:
+            token["profile"].disable()
+
+    @contextmanager
+    def stage(self, name, items=None, unit="docs", **extra):
+        """
+        Context manager around one stage. The yielded dict can be updated with
+        `items` (and other fields) once they are known inside the block.
+        """
+        token = self.start(name)
+        details = {"items": items, "unit": unit, **extra}
+        try:
+            yield details
+        except BaseException:
+            self.cancel(token)
+            raise
+        self.stop(token, **details)
+
+    def add_record(self, stage, wall_s, cpu_s, peak_mem_mb=None, items=None, unit="docs", **extra):
+        """Adds an already measured stage, e.g. one timed inside a worker process."""
+        record = {
+            "stage": stage,
+            "wall_s": wall_s,
+            "cpu_s": cpu_s,
+            "peak_mem_mb": peak_mem_mb,
+            "items": items,
+            "unit": unit,
+            "throughput": items / wall_s if items is not None and wall_s > 0 else None,
+            **extra,
+        }
+        self.records.append(record)
+        return record
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def rows(self):
+        """Records formatted for a table: rounded values and a `unit/s` throughput label."""
+        rows = []
+        for record in self.records:
+            rows.append({
+                "stage": record["stage"],
+                "year": record.get("year"),
+                "wall (s)": round(record["wall_s"], 4),
+                "cpu (s)": round(record["cpu_s"], 4),
+                "peak mem (MB)": None if record["peak_mem_mb"] is None else round(record["peak_mem_mb"], 1),
+                "items": record["items"],
+                "throughput": None if record["throughput"] is None else f"{record['throughput']:,.0f} {record['unit']}/s",
+            })
+        return rows
+
+    def format_table(self):
+        """Plain-text timing table for terminal output."""
+        lines = [f"{'stage':<14}{'year':>6}{'wall (s)':>11}{'cpu (s)':>11}{'peak MB':>10}{'throughput':>22}"]
+        for row in self.rows():
+            peak = "" if row["peak mem (MB)"] is None else row["peak mem (MB)"]
+            year = "" if row["year"] is None else row["year"]
+            lines.append(f"{row['stage']:<14}{year:>6}{row['wall (s)']:>11}{row['cpu (s)']:>11}"
+                         f"{peak:>10}{row['throughput'] or '':>22}")
+        return "\n".join(lines)
+
+    def write_trace(self, path=None, **metadata):
+        """Writes the run's records (plus metadata) as a JSON trace and returns its path."""
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, f"trace-{int(self.started_at * 1000)}-{os.getpid()}.json")
+        trace = {
+            "started_at": self.started_at,
+            "trace_memory": self.trace_memory,
+            "profile_paths": self.profile_paths,
+            **metadata,
+            "stages": self.records,
+        }
+        with open(path, "w") as f:
+            json.dump(trace, f, indent=4, default=str)
+        return path
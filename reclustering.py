@@ -0,0 +1,132 @@
+"""
+Re-clustering a stored analysis with new DBSCAN parameters.
+
+Next to its clusters, an analysis directory keeps what re-clustering needs:
+- graph.json                              max_eps of the stored graphs and their years
+- idf.npy                                 global IDF vector
+- graph_{year}_indptr.npy / _indices.npy / _similarities.npy
+                                          neighbor graph up to max_eps (see clustering.neighbor_graph)
+- graph_{year}_counts.npz                 sparse term counts, to rebuild the year's TF-IDF
+- graph_{year}_doc_lengths.npy
+
+Any eps <= max_eps and any min_pts is then a linear pass over the graph
+plus the centroid/keyword/linking steps; no distance is recomputed.
+Results go to recluster/eps{eps}-min{min_pts}/ inside the analysis
+directory, in the same layout as the analysis itself, and are reused when
+the same parameters are asked for again.
+"""
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+import scipy.sparse as sp
+
+from clustering import dbscan_from_graph
+from tfidf_manual import tfidf_from_counts
+from cluster_semantics import aggregate_clusters, extract_cluster_semantics, extract_cluster_keyword_ids
+from semantic_linking import link_cluster_edges, edges_to_links
+from save_results import save_vocabulary, save_year_clusters, save_link_edges, save_links, load_links
+from centroid_store import load_vocabulary, open_year
+from results_store import MANIFEST_FILE
+
+GRAPH_META_FILE = "graph.json"
+IDF_FILE = "idf.npy"
+RECLUSTER_DIR = "recluster"
+
+def graph_path(results_dir, year, column, ext="npy"):
+    return os.path.join(results_dir, f"graph_{year}_{column}.{ext}")
+
+def write_graph_meta(results_dir, max_eps, years, idf):
+    np.save(os.path.join(results_dir, IDF_FILE), np.asarray(idf, dtype=np.float64))
+    with open(os.path.join(results_dir, GRAPH_META_FILE), "w") as f:
+        json.dump({"max_eps": max_eps, "years": sorted(int(y) for y in years)}, f, indent=4)
+
+def write_year_graph(results_dir, year, graph, counts, doc_lengths):
+    indptr, indices, similarities = graph
+    np.save(graph_path(results_dir, year, "indptr"), indptr)
+    np.save(graph_path(results_dir, year, "indices"), indices)
+    np.save(graph_path(results_dir, year, "similarities"), similarities)
+    sp.save_npz(graph_path(results_dir, year, "counts", "npz"), sp.csr_matrix(counts))
+    np.save(graph_path(results_dir, year, "doc_lengths"), doc_lengths)
+
+def load_graph_meta(results_dir):
+    """{"max_eps": ..., "years": [...]} of a directory's stored graphs, or None if it has none."""
+    try:
+        with open(os.path.join(results_dir, GRAPH_META_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_year_graph(results_dir, year, mmap_mode="r"):
+    """Returns (graph, counts, doc_lengths) for one year; the graph arrays are memory-mapped."""
+    graph = tuple(
+        np.load(graph_path(results_dir, year, column), mmap_mode=mmap_mode, allow_pickle=False)
+        for column in ("indptr", "indices", "similarities")
+    )
+    counts = sp.load_npz(graph_path(results_dir, year, "counts", "npz"))
+    doc_lengths = np.load(graph_path(results_dir, year, "doc_lengths"), allow_pickle=False)
+    return graph, counts, doc_lengths
+
+def recluster_dir(results_dir, eps, min_pts):
+    return os.path.join(results_dir, RECLUSTER_DIR, f"eps{round(eps, 4):g}-min{int(min_pts)}")
+
+def _cluster_sizes(results_dir, years):
+    sizes = {}
+    for year in years:
+        stored = open_year(results_dir, year)
+        sizes[year] = {} if stored is None else {int(c): int(s) for c, s in zip(stored.ids, stored.sizes)}
+    return sizes
+
+def recluster(results_dir, eps, min_pts):
+    """
+    Clusters every stored year of an analysis again with (eps, min_pts),
+    reusing its neighbor graphs, and relinks the years with the analysis'
+    own top_n and linking parameters.
+    Returns a dict with links, cluster_sizes and results_dir.
+    """
+    with open(os.path.join(results_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    params = manifest["params"]
+    years = list(range(manifest["start_year"], manifest["end_year"] + 1))
+    if round(eps, 4) == round(params["eps"], 4) and int(min_pts) == params["min_pts"]:
+        return {"links": load_links(results_dir), "cluster_sizes": _cluster_sizes(results_dir, years),
+                "results_dir": results_dir}
+
+    meta = load_graph_meta(results_dir)
+    if meta is None:
+        raise ValueError(f"{results_dir} has no stored neighbor graphs to re-cluster from")
+    if eps > meta["max_eps"] + 1e-9:
+        raise ValueError(f"eps={eps} is above the stored graphs' max_eps={meta['max_eps']}")
+
+    target = recluster_dir(results_dir, eps, min_pts)
+    if not os.path.exists(os.path.join(target, "topic_links_semantic.json")):
+        idf = np.load(os.path.join(results_dir, IDF_FILE), allow_pickle=False)
+        staging = os.path.join(results_dir, RECLUSTER_DIR, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            save_vocabulary(load_vocabulary(results_dir), results_dir=staging)
+            year_clusters = {}
+            for year in meta["years"]:
+                graph, counts, doc_lengths = load_year_graph(results_dir, year)
+                labels = dbscan_from_graph(graph, eps, min_pts)
+                tfidf_matrix = tfidf_from_counts(counts, doc_lengths, idf)
+                aggregates = aggregate_clusters(tfidf_matrix, labels, top_n=params["top_n"])
+                semantics = extract_cluster_semantics(tfidf_matrix, labels, aggregates=aggregates)
+                keyword_ids = extract_cluster_keyword_ids(tfidf_matrix, labels, top_n=params["top_n"],
+                                                          aggregates=aggregates)
+                sizes = dict(zip(aggregates["ids"].tolist(), aggregates["sizes"].tolist()))
+                save_year_clusters(year, semantics, keyword_ids, sizes, results_dir=staging)
+                year_clusters[year] = semantics
+            edges = link_cluster_edges(year_clusters, threshold=params["link_threshold"],
+                                       top_k=params.get("link_top_k"), span=params.get("link_span", 1))
+            save_link_edges(edges, results_dir=staging)
+            save_links(edges_to_links(edges), results_dir=staging)
+            os.rename(staging, target)
+        except OSError:
+            # Another session finished the same parameters first
+            if not os.path.exists(target):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return {"links": load_links(target), "cluster_sizes": _cluster_sizes(target, years), "results_dir": target}
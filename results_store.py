@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+STORE_ROOT = os.path.join("results", "store")
+MANIFEST_FILE = "manifest.json"
+# Bump when a pipeline change makes previously stored results stale
+PIPELINE_VERSION = 4
+# Staging directories untouched this long belong to crashed or killed runs
+STAGING_TIMEOUT = 24 * 60 * 60
+
+def corpus_version(year_ids):
+    """Fingerprint of the fetched corpus: the paper ids of every year, in order."""
+    digest = hashlib.sha256()
+    for year in sorted(year_ids):
+        digest.update(f"{year}:".encode("utf-8"))
+        digest.update("\n".join(year_ids[year]).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+def analysis_key(category, start_year, end_year, params, corpus_version):
+    """
+    Content address of an analysis: a hash of the category, year range,
+    pipeline parameters (EPS, MIN_PTS, MAX_FEATURES, ...) and corpus version.
+    """
+    payload = json.dumps({
+        "category": category,
+        "start_year": start_year,
+        "end_year": end_year,
+        "params": params,
+        "corpus_version": corpus_version,
+        "pipeline_version": PIPELINE_VERSION,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+class ResultsStore:
+    """
+    Results directory with one isolated sub-directory per analysis key.
+    Entries are written to a private staging directory and renamed into
+    place, so readers never see half-written results. Least recently used
+    entries are evicted once `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(self, root=STORE_ROOT, max_entries=50, max_bytes=512 * 1024 * 1024, staging_timeout=STAGING_TIMEOUT):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.staging_timeout = staging_timeout
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key)
+
+    def lookup(self, key):
+        """Returns the manifest of a stored analysis (marking it recently used), or None."""
+        manifest_path = os.path.join(self.path_for(key), MANIFEST_FILE)
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return manifest
+
+    def new_staging_dir(self, key):
+        """Creates a private directory to write a new entry into before `commit`."""
+        path = os.path.join(self.root, f".staging-{key}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        return path
+
+    def commit(self, key, staging_dir, manifest):
+        """
+        Writes the manifest and atomically moves `staging_dir` into place.
+        If another session committed the same key first, its copy is kept.
+        Returns the entry's final path.
+        """
+        manifest = dict(manifest, key=key, created_at=time.time())
+        with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=4)
+        final_dir = self.path_for(key)
+        try:
+            os.rename(staging_dir, final_dir)
+        except OSError:
+            # Same key already committed by a concurrent run: identical content
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self.evict(keep=key)
+        return final_dir
+
+    def discard(self, staging_dir):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def entries(self):
+        """Lists committed entries as (key, last_access, size_bytes), most recently used first."""
+        found = []
+        for key in os.listdir(self.root):
+            manifest_path = os.path.join(self.root, key, MANIFEST_FILE)
+            if key.startswith(".") or not os.path.exists(manifest_path):
+                continue
+            found.append((key, os.path.getmtime(manifest_path), _dir_size(self.path_for(key))))
+        return sorted(found, key=lambda entry: entry[1], reverse=True)
+
+    def discard_stale_staging(self, now=None):
+        """Removes staging directories not modified for `staging_timeout` seconds."""
+        now = time.time() if now is None else now
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not name.startswith(".staging-"):
+                continue
+            try:
+                stale = now - os.path.getmtime(path) > self.staging_timeout
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def evict(self, keep=None):
+        """Drops least recently used entries beyond the count and size limits, and stale staging directories."""
+        self.discard_stale_staging()
+        total = 0
+        for index, (key, _, size) in enumerate(self.entries()):
+            total += size
+            over_limit = index >= self.max_entries or total > self.max_bytes
+            if over_limit and key != keep:
+                shutil.rmtree(self.path_for(key), ignore_errors=True)
+                total -= size
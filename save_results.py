@@ -1,16 +1,41 @@
 import os
 import numpy as np
 import json
+import centroid_store
 
-def save_cluster_semantics(year, cluster_semantics):
-    os.makedirs("results", exist_ok=True)  # ensure folder exists
-    # Save as a dictionary
-    np.save(f"results/clusters_semantics_{year}.npy", cluster_semantics)
+RESULTS_DIR = "results"
 
-def save_cluster_keywords(year, cluster_keywords):
-    os.makedirs("results", exist_ok=True)  # ensure folder exists
-    # Convert numpy int keys to python int if necessary
-    keywords_to_save = {int(k): v for k, v in cluster_keywords.items()}
-    with open(f"results/clusters_keywords_{year}.json", "w") as f:
-        json.dump(keywords_to_save, f, indent=4)
+def save_vocabulary(vocab, results_dir=RESULTS_DIR):
+    centroid_store.write_vocabulary(results_dir, vocab)
 
+def save_year_clusters(year, cluster_semantics, cluster_keyword_ids, cluster_sizes, results_dir=RESULTS_DIR):
+    """
+    Saves one year's centroids, sizes and keyword ids in the columnar
+    centroid store format (see centroid_store.py), ordered by cluster id.
+    """
+    cluster_ids = sorted(int(k) for k in cluster_semantics)
+    width = max((len(ids) for ids in cluster_keyword_ids.values()), default=0)
+    keyword_ids = np.full((len(cluster_ids), width), -1, dtype=np.int32)
+    for row, cluster_id in enumerate(cluster_ids):
+        ids = cluster_keyword_ids.get(cluster_id, [])
+        keyword_ids[row, :len(ids)] = ids
+    centroids = [np.asarray(cluster_semantics[cluster_id]).ravel() for cluster_id in cluster_ids]
+    centroid_store.write_year(
+        results_dir, year, cluster_ids,
+        np.vstack(centroids) if centroids else np.zeros((0, 0), dtype=np.float32),
+        [cluster_sizes.get(cluster_id, 0) for cluster_id in cluster_ids],
+        keyword_ids
+    )
+
+def save_link_edges(edges, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    np.save(os.path.join(results_dir, "topic_links.npy"), edges)
+
+def save_links(links, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, "topic_links_semantic.json"), "w") as f:
+        json.dump(links, f, indent=4)
+
+def load_links(results_dir=RESULTS_DIR):
+    with open(os.path.join(results_dir, "topic_links_semantic.json"), "r") as f:
+        return json.load(f)
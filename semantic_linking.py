@@ -1,58 +1,122 @@
 import numpy as np
-import glob
-import os
-import json
+import scipy.sparse as sp
+from clustering import normalize_rows
+from centroid_store import open_year
+
+# One row per link; a compact alternative to a list of dicts
+LINK_DTYPE = np.dtype([
+    ("source_year", np.int32),
+    ("source_cluster", np.int32),
+    ("target_year", np.int32),
+    ("target_cluster", np.int32),
+    ("similarity", np.float64),
+])
+
+def _dense_vector(v):
+    """Flattens a dense or scipy sparse vector into a 1-D numpy array."""
+    if sp.issparse(v):
+        return v.toarray().ravel()
+    return np.asarray(v).ravel()
 
 def cosine_similarity(a, b):
+    a, b = _dense_vector(a), _dense_vector(b)
     dot = np.dot(a, b)
     norm_a, norm_b = np.linalg.norm(a), np.linalg.norm(b)
     return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
 
-def link_clusters_semantic(start_year, end_year, threshold=0.1):
+def centroid_matrix(clusters):
     """
-    Loads cluster semantic vectors and links across a SPECIFIED range of years.
-    The required arguments 'start_year' and 'end_year' come before the
-    optional 'threshold' argument.
+    Stacks a {cluster_id: vector} dict into (cluster_ids, unit-norm matrix),
+    keeping the dict's order.
     """
-    search_path = os.path.join("results", "clusters_semantics_*.npy")
-    all_files = sorted(glob.glob(search_path))
-    year_clusters = {}
+    ids = np.array([int(c) for c in clusters], dtype=np.int32)
+    matrix = np.vstack([_dense_vector(v) for v in clusters.values()])
+    return ids, normalize_rows(matrix)
 
-    # Filter files to only include those within the selected date range
-    files_in_range = []
-    for year in range(start_year, end_year + 1):
-        # Construct the expected filename for the current year
-        expected_file = os.path.join("results", f"clusters_semantics_{year}.npy")
-        if expected_file in all_files:
-            files_in_range.append(expected_file)
-
-    for file in files_in_range:
-        try:
-            year = int(file.split('_')[-1].split('.')[0])
-            data = np.load(file, allow_pickle=True).item()
-            if data:
-                year_clusters[year] = data
-        except (ValueError, IndexError):
-            continue
-
-    links = []
-    years = sorted(year_clusters.keys())
+def link_year_pair(source_year, source_ids, source_unit, target_year, target_ids, target_unit,
+                   threshold=0.1, top_k=None):
+    """
+    Links two years' clusters with one matrix multiply.
+    Keeps pairs with similarity >= threshold and, if `top_k` is set, only the
+    k most similar targets of each source cluster. Returns a LINK_DTYPE array.
+    """
+    sims = source_unit @ target_unit.T
+    keep = sims >= threshold
+    if top_k is not None and top_k < sims.shape[1]:
+        # Similarity of each row's k-th best target; ties at that value are kept
+        kth = -np.partition(-sims, top_k - 1, axis=1)[:, top_k - 1]
+        keep &= sims >= kth[:, None]
+    rows, cols = np.nonzero(keep)
+    edges = np.empty(len(rows), dtype=LINK_DTYPE)
+    edges["source_year"] = source_year
+    edges["source_cluster"] = source_ids[rows]
+    edges["target_year"] = target_year
+    edges["target_cluster"] = target_ids[cols]
+    edges["similarity"] = sims[rows, cols]
+    return edges
 
-    for i in range(len(years) - 1):
-        y1, y2 = years[i], years[i+1]
+def _ids_and_unit(clusters):
+    """(cluster_ids, unit-norm matrix) from a {cluster_id: vector} dict or an (ids, matrix) pair."""
+    if isinstance(clusters, dict):
+        return centroid_matrix(clusters)
+    ids, matrix = clusters
+    return np.asarray(ids, dtype=np.int32), normalize_rows(matrix)
 
-        if y1 not in year_clusters or y2 not in year_clusters:
+def link_cluster_edges(year_clusters, threshold=0.1, top_k=None, span=1):
+    """
+    Links clusters across years given {year: clusters}, where clusters is either
+    a {cluster_id: centroid} dict or a (cluster_ids, centroid_matrix) pair.
+    Each year with clusters is linked to the next `span` years that have
+    clusters (span=1 links consecutive years only; span=2 also skips one, ...).
+    Returns a LINK_DTYPE edge array ordered by source year, target year,
+    source cluster and target cluster.
+    """
+    matrices = {}
+    for year, clusters in year_clusters.items():
+        if isinstance(clusters, dict) and not clusters:
             continue
+        ids, unit = _ids_and_unit(clusters)
+        if len(ids):
+            matrices[year] = (ids, unit)
+    years = sorted(matrices)
+    edges = []
+    for i, y1 in enumerate(years):
+        for y2 in years[i + 1:i + 1 + span]:
+            ids1, unit1 = matrices[y1]
+            ids2, unit2 = matrices[y2]
+            edges.append(link_year_pair(y1, ids1, unit1, y2, ids2, unit2, threshold, top_k))
+    return np.concatenate(edges) if edges else np.empty(0, dtype=LINK_DTYPE)
+
+def edges_to_links(edges):
+    """Converts a LINK_DTYPE array into the list-of-dicts format used by the UI and JSON files."""
+    return [
+        {
+            "source_year": int(e["source_year"]),
+            "source_cluster": int(e["source_cluster"]),
+            "target_year": int(e["target_year"]),
+            "target_cluster": int(e["target_cluster"]),
+            "similarity": float(e["similarity"])
+        }
+        for e in edges
+    ]
 
-        for c1, vec1 in year_clusters[y1].items():
-            for c2, vec2 in year_clusters[y2].items():
-                sim = cosine_similarity(vec1, vec2)
-                if sim >= threshold:
-                    links.append({
-                        "source_year": y1,
-                        "source_cluster": int(c1),
-                        "target_year": y2,
-                        "target_cluster": int(c2),
-                        "similarity": float(sim)
-                    })
-    return links
+def load_year_clusters(start_year, end_year, results_dir="results"):
+    """
+    Loads {year: (cluster_ids, centroid_matrix)} for the years in range that have
+    stored clusters. Centroids are memory-mapped from the centroid store.
+    """
+    year_clusters = {}
+    for year in range(start_year, end_year + 1):
+        stored = open_year(results_dir, year)
+        if stored is not None and len(stored):
+            year_clusters[year] = (stored.ids, stored.centroids)
+    return year_clusters
+
+def link_clusters_semantic(start_year, end_year, threshold=0.1, results_dir="results", top_k=None, span=1):
+    """
+    Loads cluster semantic vectors and links across a SPECIFIED range of years.
+    The required arguments 'start_year' and 'end_year' come before the
+    optional 'threshold' argument. See `link_cluster_edges` for top_k and span.
+    """
+    year_clusters = load_year_clusters(start_year, end_year, results_dir)
+    return edges_to_links(link_cluster_edges(year_clusters, threshold, top_k=top_k, span=span))
@@ -0,0 +1,115 @@
+"""
+Precomputed analysis snapshots: one compressed .npz per (category, start_year, end_year)
+that holds everything the app shows, so prebuilt views render without running
+(or even importing) the pipeline.
+
+Arrays of a snapshot:
+- meta            JSON string: category, start_year, end_year, params, exported_at
+- vocab           unicode array of vocabulary terms
+- cluster_years / cluster_ids / cluster_sizes
+                  one row per cluster over all years, by year then cluster id
+- keyword_ids     int32 vocab indices of each cluster's top keywords, -1 padded
+- centroids       float32 centroid matrix (clusters x vocab)
+- edges           link edges in semantic_linking.LINK_DTYPE, in saved order
+
+Reading a snapshot only needs numpy; exporting one reads an analysis
+directory of the results store.
+"""
+import json
+import os
+import sys
+import time
+import numpy as np
+
+SNAPSHOT_DIR = os.path.join("results", "snapshots")
+
+def snapshot_path(category, start_year, end_year, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"{category}_{int(start_year)}-{int(end_year)}.npz")
+
+def export_snapshot(results_dir, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Bundles the links, cluster sizes, keywords and centroids of a stored
+    analysis (a results store directory) into one snapshot file.
+    Returns the snapshot's path.
+    """
+    from centroid_store import load_vocabulary, open_year
+    from results_store import MANIFEST_FILE
+
+    with open(os.path.join(results_dir, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    vocab = load_vocabulary(results_dir)
+    years, ids, sizes, keyword_rows, centroid_rows = [], [], [], [], []
+    for year in range(manifest["start_year"], manifest["end_year"] + 1):
+        stored = open_year(results_dir, year)
+        if stored is None or not len(stored):
+            continue
+        years.extend([year] * len(stored))
+        ids.extend(stored.ids.tolist())
+        sizes.extend(stored.sizes.tolist())
+        keyword_rows.extend(stored.keyword_ids)
+        centroid_rows.append(np.asarray(stored.centroids, dtype=np.float32))
+    width = max((len(row) for row in keyword_rows), default=0)
+    keyword_ids = np.full((len(keyword_rows), width), -1, dtype=np.int32)
+    for row, keywords in enumerate(keyword_rows):
+        keyword_ids[row, :len(keywords)] = keywords
+    n_features = 0 if vocab is None else len(vocab)
+    centroids = np.vstack(centroid_rows) if centroid_rows else np.zeros((0, n_features), dtype=np.float32)
+    edges = np.load(os.path.join(results_dir, "topic_links.npy"), allow_pickle=False)
+    meta = {"category": manifest["category"], "start_year": manifest["start_year"],
+            "end_year": manifest["end_year"], "params": manifest["params"], "exported_at": time.time()}
+
+    path = snapshot_path(manifest["category"], manifest["start_year"], manifest["end_year"], snapshot_dir)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # Written next to the target and renamed, so the app never reads half a snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(
+        tmp_path, meta=np.array(json.dumps(meta)),
+        vocab=np.array([] if vocab is None else vocab, dtype=str),
+        cluster_years=np.array(years, dtype=np.int32), cluster_ids=np.array(ids, dtype=np.int32),
+        cluster_sizes=np.array(sizes, dtype=np.int32), keyword_ids=keyword_ids, centroids=centroids, edges=edges,
+    )
+    os.replace(tmp_path, path)
+    return path
+
+def read_snapshot(path, with_centroids=False):
+    """
+    Loads a snapshot in the shapes the app uses: a dict with meta, links,
+    cluster_sizes ({year: {cluster_id: size}}, every year of the range) and
+    keywords ({year: {str(cluster_id): [words]}}); plus centroids
+    ({year: {cluster_id: vector}}) with `with_centroids`.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        vocab = data["vocab"]
+        years, ids, sizes = data["cluster_years"].tolist(), data["cluster_ids"].tolist(), data["cluster_sizes"].tolist()
+        keyword_ids = data["keyword_ids"]
+        edges = data["edges"]
+        centroids = data["centroids"] if with_centroids else None
+
+    cluster_sizes = {year: {} for year in range(meta["start_year"], meta["end_year"] + 1)}
+    keywords = {year: {} for year in cluster_sizes}
+    for row, (year, cid, size) in enumerate(zip(years, ids, sizes)):
+        cluster_sizes[year][cid] = size
+        keywords[year][str(cid)] = [str(vocab[i]) for i in keyword_ids[row] if i >= 0]
+    links = [
+        {"source_year": int(e["source_year"]), "source_cluster": int(e["source_cluster"]),
+         "target_year": int(e["target_year"]), "target_cluster": int(e["target_cluster"]),
+         "similarity": float(e["similarity"])}
+        for e in edges
+    ]
+    snapshot = {"meta": meta, "links": links, "cluster_sizes": cluster_sizes, "keywords": keywords}
+    if with_centroids:
+        snapshot["centroids"] = {year: {} for year in cluster_sizes}
+        for row, (year, cid) in enumerate(zip(years, ids)):
+            snapshot["centroids"][year][cid] = centroids[row]
+    return snapshot
+
+def find_snapshot(category, start_year, end_year, snapshot_dir=SNAPSHOT_DIR):
+    """Path of the snapshot for this view, or None if none was exported."""
+    path = snapshot_path(category, start_year, end_year, snapshot_dir)
+    return path if os.path.exists(path) else None
+
+if __name__ == "__main__":
+    # python snapshots.py RESULTS_DIR [RESULTS_DIR ...]
+    for results_dir in sys.argv[1:]:
+        print(f"📦 Snapshot written to {export_snapshot(results_dir)}")
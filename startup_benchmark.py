@@ -0,0 +1,137 @@
+"""
+Cold-start benchmark for the Streamlit app.
+
+Every sample starts a fresh interpreter that runs app.py headlessly with
+streamlit's AppTest and measures:
+- first_paint_s: from interpreter start to the end of the first script run
+  (sidebar form drawn), imports included
+- rerun_s: mean time of a rerun without interaction, the overhead every
+  widget change pays, on the empty page and (with --snapshot) on a
+  precomputed view
+- the heavy modules loaded by the first run
+
+    python startup_benchmark.py --samples 5
+    python startup_benchmark.py --snapshot cs.AI 2019 2021
+    python startup_benchmark.py --compare bench_results/startup-old.json bench_results/startup-new.json
+"""
+import time
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+RESULTS_DIR = "bench_results"
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Modules the first paint should not need
+HEAVY_MODULES = ("pipeline", "reclustering", "clustering", "scipy.sparse", "sklearn", "feedparser",
+                 "plotly.express", "plotly.graph_objs._figure")
+
+def _timed_reruns(at, reruns):
+    times = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - started)
+    return times
+
+def measure(reruns=5, snapshot=None):
+    """One sample, in this (fresh) process. Returns a dict of timings."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    sample = {"first_paint_s": time.perf_counter() - _STARTED,
+              "exceptions": [str(e.value) for e in at.exception],
+              "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules]}
+    sample["rerun_s"] = statistics.mean(_timed_reruns(at, reruns)) if reruns else None
+    if snapshot is not None:
+        from categories import CS_CATEGORIES
+        category, start_year, end_year = snapshot
+        field = next(name for name, code in CS_CATEGORIES.items() if code == category)
+        at.sidebar.selectbox[0].select(field)
+        at.sidebar.slider[0].set_value((int(start_year), int(end_year)))
+        at.sidebar.button[0].click()
+        started = time.perf_counter()
+        at.run()
+        sample["view_load_s"] = time.perf_counter() - started
+        sample["view_rerun_s"] = statistics.mean(_timed_reruns(at, reruns)) if reruns else None
+        sample["exceptions"] += [str(e.value) for e in at.exception]
+    return sample
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(APP_PATH)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_samples(samples, reruns, snapshot=None):
+    """Runs each sample in its own interpreter, so every first paint is a cold start."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--reruns", str(reruns)]
+    if snapshot is not None:
+        command += ["--snapshot", *snapshot]
+    results = []
+    for _ in range(samples):
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def summarize(results):
+    """Median of every timing over the samples."""
+    keys = [key for key in results[0] if key.endswith("_s") and results[0][key] is not None]
+    return {key: statistics.median(result[key] for result in results) for key in keys}
+
+def compare(old_path, new_path):
+    """Prints median timing ratios (new / old) of two result files."""
+    with open(old_path) as f:
+        old = json.load(f)["summary"]
+    with open(new_path) as f:
+        new = json.load(f)["summary"]
+    print(f"{'metric':<16}{'old (s)':>10}{'new (s)':>10}{'ratio':>8}")
+    for key in new:
+        if key in old:
+            ratio = new[key] / old[key] if old[key] > 0 else float("inf")
+            flag = "  ⚠" if ratio > 1.2 else ""
+            print(f"{key:<16}{old[key]:>10.3f}{new[key]:>10.3f}{ratio:>8.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Streamlit app's cold start and reruns.")
+    parser.add_argument("--samples", type=int, default=3, help="cold starts to measure")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns timed per sample")
+    parser.add_argument("--snapshot", nargs=3, metavar=("CATEGORY", "START", "END"),
+                        help="also load this exported snapshot view and time its reruns")
+    parser.add_argument("--output", help=f"JSON output path (default: {RESULTS_DIR}/startup-<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.reruns, args.snapshot)))
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_samples(args.samples, args.reruns, args.snapshot)
+    summary = summarize(results)
+    for key, value in summary.items():
+        print(f"  {key:<16}{value:>8.3f}s")
+    print(f"  heavy modules at first paint: {', '.join(results[0]['heavy_modules']) or 'none'}")
+    for exception in results[0]["exceptions"]:
+        print(f"  ❌ {exception}")
+
+    commit = _git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{commit or 'nogit'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "created_at": time.time(), "python": platform.python_version(),
+                   "config": vars(args), "summary": summary, "samples": results}, f, indent=4)
+    print(f"\n📁 Results written to {output}")
+
+if __name__ == "__main__":
+    main()
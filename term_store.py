@@ -0,0 +1,189 @@
+"""
+Per-category store of what each fetched year contributes to the global
+vocabulary and IDF, plus the DBSCAN labels it was last clustered with.
+
+Extending an analysis (say 2019-2023 to 2019-2024) then only tokenizes the
+new or changed years: the vocabulary and IDF are merged from the stored
+per-year term counts. Stored labels are reused only for a year whose words
+kept their vocabulary membership and IDF (see `year_affected`); its TF-IDF
+and centroids, which are cheap, are then rebuilt under the new vocabulary.
+The IDF depends on the total document count, so with the default tolerance
+of 0 extending a range re-clusters every year and labels are reused only
+when the same years are analysed again (e.g. with other linking or top-n
+parameters). A positive tolerance also reuses labels after the IDF shifts
+an extension causes, at the price of results that depend on which analyses
+ran before.
+
+Rows are keyed by the year's corpus version (its paper ids), so a year
+whose papers changed, e.g. the current one, is always recomputed.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import scipy.sparse as sp
+
+DEFAULT_TERM_STORE_PATH = os.path.join("cache", "term_stats.sqlite")
+
+# Largest relative IDF change, over a year's own vocabulary terms, under which its labels are reused.
+# 0 reuses them only under an identical IDF, so results never depend on earlier runs
+IDF_TOLERANCE = 0.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS year_terms (
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    corpus_version TEXT NOT NULL,
+    n_docs INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (category, year)
+);
+CREATE TABLE IF NOT EXISTS year_labels (
+    category TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    params_key TEXT NOT NULL,
+    corpus_version TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (category, year, params_key)
+);
+"""
+
+def _pack(**arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+def _unpack(payload):
+    with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+class TermStore:
+    """
+    On-disk SQLite store of per-year term counts and cluster labels,
+    one row per (category, year) and per (category, year, clustering parameters).
+    """
+
+    def __init__(self, path=DEFAULT_TERM_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # A fresh connection per call keeps the store safe to share between threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_terms(self, category, year, corpus_version):
+        """
+        Returns the (terms, counts, doc_lengths) of `tfidf_manual.year_term_counts`
+        stored for this version of the year, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM year_terms WHERE category = ? AND year = ? AND corpus_version = ?",
+                (category, year, corpus_version)
+            ).fetchone()
+        if row is None:
+            return None
+        data = _unpack(row[0])
+        counts = sp.csr_matrix((data["data"], data["indices"], data["indptr"]),
+                               shape=(len(data["doc_lengths"]), len(data["terms"])))
+        return data["terms"].tolist(), counts, data["doc_lengths"]
+
+    def put_terms(self, category, year, corpus_version, terms, counts, doc_lengths):
+        """Stores (or replaces) a year's term counts."""
+        payload = _pack(terms=np.array(terms, dtype=str), data=counts.data, indices=counts.indices,
+                        indptr=counts.indptr, doc_lengths=np.asarray(doc_lengths))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO year_terms VALUES (?, ?, ?, ?, ?, ?)",
+                (category, year, corpus_version, len(doc_lengths), payload, time.time())
+            )
+
+    def has_terms(self, category, year, corpus_version):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM year_terms WHERE category = ? AND year = ? AND corpus_version = ?",
+                (category, year, corpus_version)
+            ).fetchone()
+        return row is not None
+
+    def get_labels(self, category, year, corpus_version, params_key):
+        """
+        Returns {"labels", "vocab", "idf", "graph"} of the year's last clustering
+        with these parameters, or None; `graph` is None when none was kept.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM year_labels "
+                "WHERE category = ? AND year = ? AND params_key = ? AND corpus_version = ?",
+                (category, year, params_key, corpus_version)
+            ).fetchone()
+        if row is None:
+            return None
+        data = _unpack(row[0])
+        graph = (data["indptr"], data["indices"], data["similarities"]) if "indptr" in data else None
+        return {"labels": data["labels"], "vocab": data["vocab"].tolist(), "idf": data["idf"], "graph": graph}
+
+    def put_labels(self, category, year, corpus_version, params_key, labels, vocab, idf, graph=None):
+        """Stores a year's labels with the vocabulary and IDF they were computed under."""
+        arrays = {"labels": np.asarray(labels, dtype=np.int64), "vocab": np.array(vocab, dtype=str),
+                  "idf": np.asarray(idf, dtype=np.float64)}
+        if graph is not None:
+            arrays.update(zip(("indptr", "indices", "similarities"), graph))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO year_labels VALUES (?, ?, ?, ?, ?, ?)",
+                (category, year, params_key, corpus_version, _pack(**arrays), time.time())
+            )
+
+    def clear(self, category=None):
+        """Drops stored years, optionally only for one category."""
+        clause, params = (" WHERE category = ?", [category]) if category is not None else ("", [])
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM year_terms{clause}", params)
+            conn.execute(f"DELETE FROM year_labels{clause}", params)
+
+def labels_key(params):
+    """Short hash of the clustering parameters that a year's labels depend on."""
+    payload = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def year_affected(terms, old_vocab, old_idf, new_vocab, new_idf, tolerance=IDF_TOLERANCE):
+    """
+    Whether a year's TF-IDF rows drifted too far from the ones its stored
+    labels were computed on: a word of the year entered or left the
+    vocabulary, or the IDF of one of its vocabulary words moved by more
+    than `tolerance` (relative). Column order does not matter to cosine
+    DBSCAN, so a reordered vocabulary alone does not affect a year.
+    """
+    old_index = {term: i for i, term in enumerate(old_vocab)}
+    new_index = {term: i for i, term in enumerate(new_vocab)}
+    old_cols, new_cols = [], []
+    for term in terms:
+        i, j = old_index.get(term), new_index.get(term)
+        if (i is None) != (j is None):
+            return True
+        if i is not None:
+            old_cols.append(i)
+            new_cols.append(j)
+    if not old_cols:
+        return False
+    old_values = np.asarray(old_idf)[old_cols]
+    new_values = np.asarray(new_idf)[new_cols]
+    return bool(np.max(np.abs(new_values - old_values) / old_values) > tolerance)
+
+_default_store = None
+
+def get_default_term_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = TermStore()
+    return _default_store
@@ -0,0 +1,20 @@
+import os
+import tempfile
+from datetime import datetime
+
+from corpus_cache import CorpusCache
+
+def _timestamp(*date):
+    return datetime(*date).timestamp()
+
+def test_window_fetched_mid_year_expires_after_the_year_ends():
+    cache = CorpusCache(os.path.join(tempfile.mkdtemp(), "cache.sqlite"), current_year_ttl=24 * 60 * 60)
+    fetched_at = _timestamp(2025, 6, 15)
+    # Still the same year, within the TTL: served from the cache
+    assert cache.is_fresh(2025, fetched_at, now=_timestamp(2025, 6, 15, 12))
+    # The year has ended, but the window only holds papers up to June: refetched
+    assert not cache.is_fresh(2025, fetched_at, now=_timestamp(2026, 1, 2))
+
+def test_window_fetched_after_the_year_ends_never_expires():
+    cache = CorpusCache(os.path.join(tempfile.mkdtemp(), "cache.sqlite"))
+    assert cache.is_fresh(2025, _timestamp(2026, 1, 2), now=_timestamp(2030, 1, 1))
@@ -1,30 +1,139 @@
 import numpy as np
+import scipy.sparse as sp
 from collections import Counter
 
+def tokens_of(doc):
+    """Words of a document given either as a cleaned string or as a token list (see preprocess_batch)."""
+    return doc.split() if isinstance(doc, str) else doc
+
 def build_vocabulary(docs, max_features=2000):
     """
     Builds a vocabulary from the documents, limited to the most frequent words.
     """
-    word_counts = Counter(" ".join(docs).split())
+    word_counts = Counter()
+    for doc in docs:
+        word_counts.update(tokens_of(doc))
     most_common_words = [word for word, count in word_counts.most_common(max_features)]
     return sorted(most_common_words)
 
 def compute_tf(doc, vocab):
-    words = doc.split()
+    words = tokens_of(doc)
     word_count = len(words)
-    return np.array([words.count(term) / word_count if word_count else 0 for term in vocab])
+    counts = Counter(words)
+    return np.array([counts[term] / word_count if word_count else 0 for term in vocab])
+
+def idf_from_doc_freq(doc_freq, n_docs):
+    """Smoothed IDF, log((N + 1) / (df + 1)) + 1, from document frequencies."""
+    return np.log((n_docs + 1) / (np.asarray(doc_freq, dtype=np.float64) + 1)) + 1
 
 def compute_idf(docs, vocab):
-    N = len(docs)
-    # Create a set of words for each document for faster 'in' check
-    docs_sets = [set(doc.split()) for doc in docs]
-    return np.array([
-        np.log((N + 1) / (sum(1 for doc_set in docs_sets if term in doc_set) + 1)) + 1
-        for term in vocab
-    ])
+    # One pass over the documents, counting each term once per document
+    doc_freq_counts = Counter()
+    for doc in docs:
+        doc_freq_counts.update(set(tokens_of(doc)))
+    doc_freq = np.array([doc_freq_counts[term] for term in vocab], dtype=np.int64)
+    return idf_from_doc_freq(doc_freq, len(docs))
+
+def build_term_counts(docs, vocab):
+    """
+    Tokenizes every document once (or takes its token list) and builds the sparse doc x term count matrix.
+    Returns (counts, doc_lengths, doc_freq):
+    - counts: CSR matrix of raw term counts restricted to `vocab`
+    - doc_lengths: number of words per document, including out-of-vocabulary ones
+    - doc_freq: number of documents containing each vocabulary term
+    """
+    term_index = {term: i for i, term in enumerate(vocab)}
+    indptr = [0]
+    indices, data, doc_lengths = [], [], []
+    for doc in docs:
+        words = tokens_of(doc)
+        doc_lengths.append(len(words))
+        row = Counter(term_index[w] for w in words if w in term_index)
+        for col in sorted(row):
+            indices.append(col)
+            data.append(row[col])
+        indptr.append(len(indices))
+    counts = sp.csr_matrix(
+        (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(doc_lengths), len(vocab))
+    )
+    doc_freq = np.bincount(counts.indices, minlength=len(vocab))
+    return counts, np.array(doc_lengths, dtype=np.int64), doc_freq
+
+def year_term_counts(docs):
+    """
+    Counts every word of one year's documents, in vocabulary or not, so the
+    year can later be restricted to any global vocabulary without re-tokenizing.
+    Returns (terms, counts, doc_lengths): the year's distinct words in order
+    of first occurrence, a CSR doc x term count matrix over them, and the
+    number of words per document.
+    """
+    term_index = {}
+    indptr = [0]
+    indices, data, doc_lengths = [], [], []
+    for doc in docs:
+        words = tokens_of(doc)
+        doc_lengths.append(len(words))
+        row = Counter(term_index.setdefault(w, len(term_index)) for w in words)
+        for col in sorted(row):
+            indices.append(col)
+            data.append(row[col])
+        indptr.append(len(indices))
+    counts = sp.csr_matrix(
+        (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(doc_lengths), len(term_index))
+    )
+    return list(term_index), counts, np.array(doc_lengths, dtype=np.int64)
+
+def vocabulary_from_term_counts(year_terms, max_features=2000):
+    """
+    Same vocabulary as `build_vocabulary` over the concatenated documents,
+    from per-year (terms, counts) pairs given in corpus order: most frequent
+    words first, ties broken by first occurrence, as Counter.most_common does.
+    """
+    term_index = {}
+    totals = []
+    for terms, counts in year_terms:
+        year_totals = np.asarray(counts.sum(axis=0)).ravel()
+        for term, total in zip(terms, year_totals.tolist()):
+            i = term_index.setdefault(term, len(term_index))
+            if i == len(totals):
+                totals.append(0)
+            totals[i] += total
+    words = list(term_index)
+    order = np.argsort(-np.array(totals, dtype=np.int64), kind="stable")[:max_features]
+    return sorted(words[i] for i in order)
+
+def restrict_counts(terms, counts, vocab):
+    """
+    Maps a year's counts over its own `terms` onto `vocab`, dropping the
+    other words. Returns (counts, doc_freq) like `build_term_counts`.
+    """
+    vocab_index = {term: i for i, term in enumerate(vocab)}
+    rows, cols = [], []
+    for i, term in enumerate(terms):
+        j = vocab_index.get(term)
+        if j is not None:
+            rows.append(i)
+            cols.append(j)
+    selection = sp.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(len(terms), len(vocab)))
+    restricted = sp.csr_matrix(counts @ selection)
+    restricted.sort_indices()
+    doc_freq = np.bincount(restricted.indices, minlength=len(vocab))
+    return restricted, doc_freq
+
+def tfidf_from_counts(counts, doc_lengths, idf, dtype=np.float64):
+    """
+    Turns a count matrix into TF-IDF (term count / document length * idf),
+    the same values as `compute_tf(doc, vocab) * idf`, kept in CSR form.
+    `dtype` (e.g. np.float32 in out-of-core mode) is the type of the stored values.
+    """
+    lengths = np.repeat(np.maximum(doc_lengths, 1), np.diff(counts.indptr))
+    data = (counts.data / lengths * idf[counts.indices]).astype(dtype, copy=False)
+    return sp.csr_matrix((data, counts.indices.copy(), counts.indptr.copy()), shape=counts.shape)
 
 def compute_tfidf_matrix(docs):
     vocab = build_vocabulary(docs)
-    idf = compute_idf(docs, vocab)
-    tfidf = np.array([compute_tf(doc, vocab) * idf for doc in docs])
-    return tfidf, vocab
\ No newline at end of file
+    counts, doc_lengths, doc_freq = build_term_counts(docs, vocab)
+    idf = idf_from_doc_freq(doc_freq, len(docs))
+    return tfidf_from_counts(counts, doc_lengths, idf), vocab
@@ -0,0 +1,120 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tfidf_manual import tfidf_from_counts
+from clustering import dbscan_cosine, neighbor_graph, dbscan_from_graph, BLOCK_MEMORY_BYTES
+from cluster_semantics import aggregate_clusters, extract_cluster_semantics, extract_cluster_keyword_ids
+from profiling import StageProfiler
+from out_of_core import open_matrix, spill_tfidf
+
+# Global IDF, installed once per worker process by `_init_worker`
+_shared = {}
+
+# Below this many documents over all years, spawning workers (each importing
+# numpy and scipy again) costs more than the clustering it spreads out
+PARALLEL_MIN_DOCS = 20000
+
+def _init_worker(idf):
+    _shared["idf"] = idf
+
+def process_year(year, counts, doc_lengths, eps, min_pts, top_n, idf=None, profile_options=None,
+                 dbscan_options=None, graph_max_eps=None, labels=None, graph=None, spill_dir=None, chunk_rows=None):
+    """
+    TF-IDF, DBSCAN (skipped when `labels` are given), centroids and keywords of one year.
+    Returns a dict with labels, cluster_sizes, semantics, keyword_ids, graph, timings and profile_paths.
+    """
+    idf = _shared["idf"] if idf is None else idf
+    profiler = StageProfiler(**(profile_options or {}))
+    n_docs = counts.shape[0]
+    dbscan_options = dbscan_options or {}
+    with profiler.stage("tfidf", items=n_docs, year=year):
+        if spill_dir is None:
+            tfidf_matrix = tfidf_from_counts(open_matrix(counts), doc_lengths, idf)
+        else:
+            # Out of core, DBSCAN reads the spilled normalized rows instead of normalizing a copy
+            tfidf_matrix, unit_rows, unit_transposed = (
+                spilled.open() for spilled in spill_tfidf(counts, doc_lengths, idf, spill_dir, f"tfidf_{year}",
+                                                          chunk_rows=chunk_rows))
+            dbscan_options = {**dbscan_options, "normalized": True, "transposed": unit_transposed}
+    # Exact DBSCAN compares every pair; the LSH mode only bucket neighbors
+    items, unit = (n_docs, "docs") if dbscan_options.get("approximate") else (n_docs * n_docs, "pairs")
+    # Stored labels (see term_store) skip the distance computations
+    if labels is None:
+        with profiler.stage("dbscan", items=items, unit=unit, year=year):
+            if graph_max_eps is not None and not dbscan_options.get("approximate"):
+                graph = neighbor_graph(tfidf_matrix, max(graph_max_eps, eps),
+                                       memory_bytes=dbscan_options.get("memory_bytes", BLOCK_MEMORY_BYTES))
+                labels = dbscan_from_graph(graph, eps, min_pts)
+            else:
+                # Out of core, the exact neighbor lists go to the spill directory instead of memory
+                spill_path = None if spill_dir is None else os.path.join(spill_dir, f"neighbors_{year}.bin")
+                labels = dbscan_cosine(unit_rows if spill_dir is not None else tfidf_matrix, eps=eps,
+                                       min_pts=min_pts, spill_path=spill_path, **dbscan_options)
+                if spill_path is not None and os.path.exists(spill_path):
+                    os.remove(spill_path)
+    # Centroids, sizes and keywords all come from one grouped pass over the labels
+    with profiler.stage("aggregate", items=n_docs, year=year):
+        aggregates = aggregate_clusters(tfidf_matrix, labels, top_n=top_n, chunk_rows=chunk_rows)
+        semantics = extract_cluster_semantics(tfidf_matrix, labels, aggregates=aggregates)
+        keyword_ids = extract_cluster_keyword_ids(tfidf_matrix, labels, top_n=top_n, aggregates=aggregates)
+    cluster_sizes = dict(zip(aggregates["ids"].tolist(), aggregates["sizes"].tolist()))
+    return {
+        "year": year,
+        "labels": labels,
+        "cluster_sizes": cluster_sizes,
+        "semantics": semantics,
+        "keyword_ids": keyword_ids,
+        "graph": graph,
+        "timings": profiler.records,
+        "profile_paths": profiler.profile_paths,
+    }
+
+def split_counts_by_year(counts, doc_lengths, year_docs, years):
+    """
+    Slices corpus-wide term counts back into {year: (counts, doc_lengths)}
+    for the years that have documents; rows follow the order of `years`.
+    """
+    year_counts, offset = {}, 0
+    for year in years:
+        n_docs = len(year_docs[year])
+        if n_docs:
+            year_counts[year] = (counts[offset:offset + n_docs], doc_lengths[offset:offset + n_docs])
+        offset += n_docs
+    return year_counts
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def iter_process_years(year_counts, idf, eps, min_pts, top_n, workers=None, profile_options=None,
+                       dbscan_options=None, graph_max_eps=None, reuse=None, spill_dir=None, chunk_rows=None):
+    """
+    Runs `process_year` for every {year: (counts, doc_lengths)} entry, on a
+    process pool with more than one worker and at least `PARALLEL_MIN_DOCS`
+    documents, and yields each result as soon as it is ready. `reuse` maps
+    years to stored {"labels", "graph"}.
+    """
+    workers = default_workers() if workers is None else workers
+    workers = min(workers, len(year_counts))
+    if sum(len(doc_lengths) for _, doc_lengths in year_counts.values()) < PARALLEL_MIN_DOCS:
+        workers = 1
+    reuse = reuse or {}
+    if workers <= 1:
+        for year, (counts, doc_lengths) in year_counts.items():
+            yield process_year(year, counts, doc_lengths, eps, min_pts, top_n, idf=idf,
+                               profile_options=profile_options, dbscan_options=dbscan_options,
+                               graph_max_eps=graph_max_eps, spill_dir=spill_dir, chunk_rows=chunk_rows,
+                               **reuse.get(year, {}))
+        return
+
+    # Spawned workers: forking the multi-threaded Streamlit server is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(idf,)) as pool:
+        futures = [
+            pool.submit(process_year, year, counts, doc_lengths, eps, min_pts, top_n, profile_options=profile_options,
+                        dbscan_options=dbscan_options, graph_max_eps=graph_max_eps, spill_dir=spill_dir,
+                        chunk_rows=chunk_rows, **reuse.get(year, {}))
+            for year, (counts, doc_lengths) in year_counts.items()
+        ]
+        for future in as_completed(futures):
+            yield future.result()